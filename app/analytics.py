@@ -0,0 +1,166 @@
+# app/analytics.py
+"""Streamlit-free analytics behind the dashboard charts.
+
+Every function takes a DataFrame (plus the per-dataset indexes where one
+exists) and returns plain DataFrames, so the computations can be reused by
+the chatbot, CLI tools and benchmarks. ``app.visualizations`` only renders
+these results.
+"""
+import numpy as np
+import pandas as pd
+
+from app.error_index import ErrorIndex
+from app.item_analysis import item_statistics
+
+__all__ = [
+    "grade_values",
+    "grade_histogram",
+    "grade_counts",
+    "histogram_from_counts",
+    "binned_kde",
+    "item_statistics",
+    "error_frequencies",
+    "top_error_types",
+    "nea_breakdown",
+    "error_shares",
+    "order_questions",
+]
+
+QUESTION_ORDERS = ("question", "difficulty", "dominant")
+# Grouping columns offered as per-question / per-cohort grade density overlays.
+GRADE_OVERLAY_COLUMNS = ("question", "cohort", "class", "section")
+KDE_GRID_SIZE = 1024
+KDE_SUPPORT_POINTS = 200
+
+
+def grade_values(df: pd.DataFrame) -> pd.Series:
+    """Numeric grades with unparseable values dropped; the frame is not modified."""
+    return pd.to_numeric(df["grade"], errors="coerce").dropna()
+
+
+def grade_counts(df: pd.DataFrame, by: str = None) -> pd.Series:
+    """Responses per grade value, or per (``by`` group, grade) pair, in one pass over the frame.
+
+    Grades take few distinct values, so histograms and densities computed
+    from these counts cost the same for a thousand rows or a million.
+    """
+    grades = pd.to_numeric(df["grade"], errors="coerce")
+    if by is None:
+        return grades.dropna().value_counts(sort=False).sort_index()
+    frame = pd.DataFrame({"group": df[by], "grade": grades}).dropna()
+    return frame.groupby(["group", "grade"], observed=True).size()
+
+
+def histogram_from_counts(counts: pd.Series, bins: int = 10) -> pd.DataFrame:
+    """Equal-width histogram of ``grade_counts`` output as ``bin_left``, ``bin_right``, ``count`` rows."""
+    if counts.sum() == 0:
+        return pd.DataFrame(columns=["bin_left", "bin_right", "count"])
+    totals, edges = np.histogram(counts.index.to_numpy(dtype=float), bins=bins, weights=counts.to_numpy(dtype=float))
+    return pd.DataFrame({"bin_left": edges[:-1], "bin_right": edges[1:], "count": totals.astype(np.int64)})
+
+
+def grade_histogram(df: pd.DataFrame, bins: int = 10) -> pd.DataFrame:
+    """Equal-width histogram of grades as ``bin_left``, ``bin_right``, ``count`` rows."""
+    return histogram_from_counts(grade_counts(df), bins)
+
+
+def binned_kde(values, weights, grid_size: int = KDE_GRID_SIZE,
+               points: int = KDE_SUPPORT_POINTS) -> pd.DataFrame:
+    """Gaussian KDE of ``values`` observed ``weights`` times each, as ``x``, ``density`` rows.
+
+    The density is evaluated over the data range. The weights are linearly
+    binned onto a regular grid and convolved with the kernel by FFT, so the
+    cost depends on ``grid_size``, not on how many observations the weights
+    stand for. The bandwidth follows Scott's rule over all observations,
+    matching what seaborn's ``histplot(kde=True)`` computes from raw values.
+    """
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    empty = pd.DataFrame(columns=["x", "density"])
+    if len(values) < 2 or total <= 1:
+        return empty
+    w = weights / total
+    mean = (w * values).sum()
+    variance = (weights * (values - mean) ** 2).sum() / (total - 1)
+    if not variance > 0:
+        return empty
+    bandwidth = np.sqrt(variance) * total ** -0.2
+
+    low, high = values.min(), values.max()
+    grid_low = low - 4 * bandwidth
+    step = (high - low + 8 * bandwidth) / (grid_size - 1)
+    position = (values - grid_low) / step
+    left = np.floor(position).astype(np.int64)
+    right_share = position - left
+    grid = (np.bincount(left, w * (1 - right_share), minlength=grid_size)
+            + np.bincount(left + 1, w * right_share, minlength=grid_size))[:grid_size]
+
+    reach = min(grid_size - 1, int(np.ceil(4 * bandwidth / step)))
+    offsets = np.arange(-reach, reach + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    n_fft = 1 << int(np.ceil(np.log2(grid_size + 2 * reach + 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(grid, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)[reach:reach + grid_size]
+
+    x = np.linspace(low, high, points)
+    grid_x = grid_low + np.arange(grid_size) * step
+    return pd.DataFrame({"x": x, "density": np.interp(x, grid_x, np.clip(smoothed, 0, None))})
+
+
+def error_frequencies(df: pd.DataFrame, column: str, question, index: ErrorIndex = None) -> pd.DataFrame:
+    """Label counts and percentages of ``column`` for one question, most frequent first."""
+    if index is None:
+        index = ErrorIndex.build(df, column)
+    return index.frequencies(question)
+
+
+def top_error_types(df: pd.DataFrame, question, n: int = 10, index: ErrorIndex = None) -> pd.DataFrame:
+    """The ``n`` most frequent ``error_summary`` labels of a question."""
+    return error_frequencies(df, "error_summary", question, index).head(n).rename(columns={"Label": "Error Type"})
+
+
+def nea_breakdown(df: pd.DataFrame, question, index: ErrorIndex = None, top: int = 4) -> pd.DataFrame:
+    """NEA category shares of a question: the ``top`` categories plus an "Others" remainder."""
+    freqs = error_frequencies(df, "error_category", question, index)
+    if freqs["Frequency"].sum() == 0:
+        return pd.DataFrame(columns=["Error Category", "Percentage"])
+
+    top_df = freqs.head(top)
+    others_pct = round(100 - top_df["Percentage"].sum(), 2)
+    labels = top_df["Label"].tolist() + (["Others"] if others_pct > 0 else [])
+    sizes = top_df["Percentage"].tolist() + ([others_pct] if others_pct > 0 else [])
+    return pd.DataFrame({"Error Category": labels, "Percentage": sizes})
+
+
+def error_shares(df: pd.DataFrame, column: str, index: ErrorIndex = None, top: int = None) -> pd.DataFrame:
+    """Percentage of each label per question (rows sum to 100), one row per question.
+
+    All questions come from one crosstab of the exploded labels; ``top``
+    keeps the most frequent labels and groups the rest as "Others".
+    """
+    if index is None:
+        index = ErrorIndex.build(df, column)
+    counts = index.crosstab(top)
+    totals = counts.sum(axis=1).replace(0, np.nan)
+    return counts.div(totals, axis=0).mul(100).fillna(0)
+
+
+def order_questions(shares: pd.DataFrame, by: str = "question", stats: pd.DataFrame = None) -> pd.DataFrame:
+    """Reorder the rows of ``error_shares`` output.
+
+    ``"difficulty"`` puts the hardest questions (lowest difficulty index in
+    ``stats``, the ``item_statistics`` output) first. ``"dominant"`` groups
+    questions by their most common label (ignoring "Others"), strongest
+    share first.
+    """
+    if by == "difficulty":
+        difficulty = stats.set_index("question")["difficulty_index"].reindex(shares.index)
+        order = np.lexsort((np.arange(len(shares)), difficulty.fillna(np.inf).to_numpy()))
+    elif by == "dominant":
+        values = shares.drop(columns="Others", errors="ignore").to_numpy()
+        dominant = values.argmax(axis=1) if values.size else np.zeros(len(shares), dtype=int)
+        strength = values.max(axis=1) if values.size else np.zeros(len(shares))
+        order = np.lexsort((np.arange(len(shares)), -strength, dominant))
+    else:
+        return shares
+    return shares.iloc[order]
@@ -0,0 +1,176 @@
+# app/bootstrap.py
+"""Bootstrap confidence intervals for item difficulty and discrimination.
+
+Students are resampled with replacement. A block of resamples is a matrix
+of per-student weights (how often each student was drawn). Every
+per-question sum is then a matrix product of those weights with the
+student x question aggregates from ``aggregate_pairs``, so a block of
+resamples costs a few BLAS calls instead of a Python loop per resample.
+The aggregates stay sparse (one entry per answered pair, sorted by
+student rank); each product densifies only a slice of students at a time.
+Blocks can be spread over a process pool for large cohorts.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.item_analysis import GROUP_FRACTION, aggregate_pairs, prepare_responses
+from app.settings import get_setting
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_LEVEL = 0.95
+_BLOCK_CELLS = 4_000_000
+_SLICE_CELLS = 1_000_000
+PAIR_VALUES = ("n", "grade_sum", "n_pos")
+
+INTERVAL_COLUMNS = [
+    "question",
+    "difficulty_low",
+    "difficulty_high",
+    "discrimination_low",
+    "discrimination_high",
+]
+
+
+def _sparse_pairs(pairs: pd.DataFrame):
+    """Questions, per-pair student ranks and question codes, and the ``PAIR_VALUES`` of each pair.
+
+    Students are ranked by total grade, best first (the order
+    ``item_statistics`` uses), and the pairs are sorted by that rank.
+    """
+    q_codes, questions = pd.factorize(pairs["question"], sort=True)
+    s_codes, students = pd.factorize(pairs["student_id"], sort=True)
+    totals = np.bincount(s_codes, weights=pairs["grade_sum"].to_numpy(dtype=float), minlength=len(students))
+    rank = np.empty(len(students), dtype=np.int32)
+    rank[np.argsort(-totals, kind="stable")] = np.arange(len(students))
+    s_rank = rank[s_codes]
+    order = np.argsort(s_rank, kind="stable")
+
+    # Counts and half-point grade sums are exact in float32.
+    values = np.empty((len(order), len(PAIR_VALUES)), dtype=np.float32)
+    for i, column in enumerate(PAIR_VALUES):
+        values[:, i] = pairs[column].to_numpy(dtype=float)[order]
+    return np.asarray(questions), len(students), s_rank[order], q_codes[order].astype(np.int32), values
+
+
+class _Resampler:
+    def __init__(self, n_students, s_rank, q_codes, values, n_questions, group_fraction):
+        self.n_students = n_students
+        self.n_questions = n_questions
+        self.s_rank = s_rank
+        self.q_codes = q_codes
+        self.values = values
+        self.group_size = int(np.ceil(n_students * group_fraction))
+        # Students [bounds[i], bounds[i + 1]) form one dense slice.
+        step = max(1, _SLICE_CELLS // max(n_questions, 1))
+        self.bounds = np.arange(0, n_students + step, step).clip(max=n_students)
+        self.offsets = np.searchsorted(s_rank, self.bounds)
+
+    def _products(self, weights: np.ndarray, column: int, out: np.ndarray = None) -> np.ndarray:
+        """``weights @ dense[:, :, column]`` for each (block, question), densifying a slice of students at a time."""
+        out = np.zeros((weights.shape[0], self.n_questions)) if out is None else out
+        for i in range(len(self.bounds) - 1):
+            lo, hi = self.bounds[i], self.bounds[i + 1]
+            start, stop = self.offsets[i], self.offsets[i + 1]
+            if lo == hi or start == stop:
+                continue
+            dense = np.zeros((hi - lo, self.n_questions))
+            dense[self.s_rank[start:stop] - lo, self.q_codes[start:stop]] = self.values[start:stop, column]
+            out += weights[:, lo:hi] @ dense
+        return out
+
+    def statistics(self, weights: np.ndarray):
+        """Difficulty and discrimination per (resample, question) for a block of weight rows."""
+        counts, grade_sums, positives = range(len(PAIR_VALUES))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            difficulty = self._products(weights, grade_sums) / self._products(weights, counts)
+
+        # Upper/lower groups take the first/last group_size draws in rank
+        # order; a student straddling the cut-off counts partially.
+        g = self.group_size
+        before = np.cumsum(weights, axis=1) - weights
+        upper = np.clip(g - before, 0, weights)
+        after = self.n_students - before - weights
+        lower = np.clip(g - after, 0, weights)
+        discrimination = self._products(upper - lower, positives) / max(g, 1)
+        return difficulty, discrimination
+
+    def draw(self, n_resamples: int, seed) -> tuple:
+        rng = np.random.default_rng(seed)
+        n = self.n_students
+        block = max(1, _BLOCK_CELLS // max(n, 1))
+        difficulty, discrimination = [], []
+        for start in range(0, n_resamples, block):
+            size = min(block, n_resamples - start)
+            draws = rng.integers(0, n, (size, n)) + (np.arange(size) * n)[:, None]
+            weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(float)
+            d, r = self.statistics(weights)
+            difficulty.append(d)
+            discrimination.append(r)
+        return np.concatenate(difficulty), np.concatenate(discrimination)
+
+
+_worker_resampler = None
+
+
+def _init_worker(*args):
+    global _worker_resampler
+    _worker_resampler = _Resampler(*args)
+
+
+def _draw_in_worker(n_resamples, seed):
+    return _worker_resampler.draw(n_resamples, seed)
+
+
+def bootstrap_intervals(pairs: pd.DataFrame, n_resamples: int = DEFAULT_RESAMPLES, level: float = DEFAULT_LEVEL,
+                        seed: int = 0, workers: int = 0, group_fraction: float = GROUP_FRACTION) -> pd.DataFrame:
+    """Percentile intervals of difficulty and discrimination per question from ``aggregate_pairs`` output.
+
+    ``workers`` > 1 splits the resamples across that many processes.
+    """
+    if pairs.empty:
+        return pd.DataFrame(columns=INTERVAL_COLUMNS)
+    questions, n_students, s_rank, q_codes, values = _sparse_pairs(pairs)
+    resampler_args = (n_students, s_rank, q_codes, values, len(questions), group_fraction)
+
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    if workers > 1:
+        shares = np.diff(np.linspace(0, n_resamples, workers + 1).astype(int))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=resampler_args,
+        ) as pool:
+            results = list(pool.map(_draw_in_worker, shares, seeds))
+        difficulty = np.concatenate([d for d, _ in results])
+        discrimination = np.concatenate([r for _, r in results])
+    else:
+        difficulty, discrimination = _Resampler(*resampler_args).draw(n_resamples, seeds[0])
+
+    tail = (1 - level) / 2 * 100
+    d_low, d_high = np.nanpercentile(difficulty, [tail, 100 - tail], axis=0)
+    r_low, r_high = np.nanpercentile(discrimination, [tail, 100 - tail], axis=0)
+    return pd.DataFrame({
+        "question": questions,
+        "difficulty_low": d_low,
+        "difficulty_high": d_high,
+        "discrimination_low": r_low,
+        "discrimination_high": r_high,
+    })
+
+
+def bootstrap_settings() -> dict:
+    """Resample count and worker processes from BOOTSTRAP_RESAMPLES / BOOTSTRAP_WORKERS."""
+    return {
+        "n_resamples": int(get_setting("BOOTSTRAP_RESAMPLES", DEFAULT_RESAMPLES)),
+        "workers": int(get_setting("BOOTSTRAP_WORKERS", 0)),
+    }
+
+
+def intervals_for(dataset, n_resamples: int = DEFAULT_RESAMPLES, workers: int = 0) -> pd.DataFrame:
+    """The dataset's cached intervals (the fixed seed makes them reproducible)."""
+    return dataset.derive(
+        f"bootstrap:{n_resamples}",
+        lambda df: bootstrap_intervals(aggregate_pairs(prepare_responses(df)), n_resamples, workers=workers),
+    )
@@ -0,0 +1,163 @@
+# app/data_store.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from app.ingest import read_csv, validate_columns
+from app.instrumentation import span
+from app.settings import get_setting
+
+DEFAULT_DATASET_PATH = "data/predicting_students_errors.csv"
+DEFAULT_BUDGET_MB = 512
+
+# Shared frames are handed to every session; copy-on-write guarantees that a
+# page deriving a column never writes through to the cached data.
+pd.set_option("mode.copy_on_write", True)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class Dataset:
+    """A parsed dataset shared read-only by every page and session.
+
+    Per-dataset artifacts (indexes, aggregates) are built once through
+    ``derive`` and live as long as the dataset stays in the store.
+    """
+
+    def __init__(self, key: str, df: pd.DataFrame, name: str = "", report: dict = None):
+        self.key = key
+        self.name = name
+        self.df = df
+        self.report = report or {}
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derive(self, name, builder):
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self.df)
+            return self._derived[name]
+
+
+class DatasetStore:
+    """Process-wide, content-addressed dataset cache with an LRU memory budget."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._path_keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _lookup(self, key):
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return dataset
+
+    def get_or_load(self, key: str, loader, name: str = "", info: dict = None) -> Dataset:
+        """Return the dataset stored under ``key``, calling ``loader() -> (df, report)`` on a miss.
+
+        ``info["cache_hit"]`` is set when an ``info`` dict is passed.
+        """
+        info = {} if info is None else info
+        info["cache_hit"] = True
+        dataset = self._lookup(key)
+        if dataset is not None:
+            return dataset
+
+        # Concurrent sessions asking for the same content wait for one parse.
+        with self._key_lock(key):
+            dataset = self._lookup(key)
+            if dataset is not None:
+                return dataset
+            info["cache_hit"] = False
+            df, report = loader()
+            dataset = Dataset(key, df, name, report)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = dataset
+                self._evict(keep=key)
+                self._key_locks.pop(key, None)
+        return dataset
+
+    def load_bytes(self, data: bytes, name: str = "", required=(), info: dict = None) -> Dataset:
+        validate_columns(data, required)
+        return self.get_or_load(content_hash(data), lambda: read_csv(data), name, info)
+
+    def load_path(self, path: str, required=(), info: dict = None) -> Dataset:
+        validate_columns(path, required)
+        stat = os.stat(path)
+        fingerprint = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            key = self._path_keys.get(fingerprint)
+        if key is not None:
+            dataset = self._lookup(key)
+            if dataset is not None:
+                if info is not None:
+                    info["cache_hit"] = True
+                return dataset
+
+        # Hash and parse straight from disk so large files are never held as bytes.
+        with open(path, "rb") as fh:
+            key = hashlib.file_digest(fh, "sha256").hexdigest()
+        with self._lock:
+            self._path_keys[fingerprint] = key
+        return self.get_or_load(key, lambda: read_csv(path), os.path.basename(path), info)
+
+    def _evict(self, keep: str):
+        total = sum(d.nbytes for d in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "bytes": sum(d.nbytes for d in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_store() -> DatasetStore:
+    budget_mb = float(get_setting("DATASET_CACHE_MB", DEFAULT_BUDGET_MB))
+    return DatasetStore(int(budget_mb * 1024 * 1024))
+
+
+def load_dataset(uploaded_file=None, path: str = None, required=()) -> Dataset:
+    """Return the shared dataset for an upload, or for the default CSV on disk.
+
+    ``required`` columns are checked from the header before anything is
+    parsed; ``app.ingest.MissingColumnsError`` is raised when some are absent.
+    """
+    store = get_dataset_store()
+    with span("load_dataset", source="upload" if uploaded_file is not None else "default") as record:
+        if uploaded_file is not None:
+            dataset = store.load_bytes(uploaded_file.getvalue(), uploaded_file.name, required, info=record)
+        else:
+            path = path or get_setting("DATASET_PATH", DEFAULT_DATASET_PATH)
+            dataset = store.load_path(path, required, info=record)
+        record["rows"] = len(dataset.df)
+    return dataset
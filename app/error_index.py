@@ -0,0 +1,121 @@
+# app/error_index.py
+"""Per-question index over comma-separated error labels.
+
+The label column is lowercased, split and exploded once per dataset. Each
+question then owns a slice of category codes sorted by frequency, so a
+Top-N or NEA lookup is a dictionary hit plus an O(k) slice.
+"""
+import numpy as np
+import pandas as pd
+
+from app.error_labels import clustering_threshold, label_mapping_for
+from app.ingest import as_text
+
+SEPARATOR = ", "
+
+
+def explode_labels(df: pd.DataFrame, column: str, mapping: pd.Series = None) -> pd.DataFrame:
+    """Return one (question, label) row per comma-separated label.
+
+    ``mapping`` (label -> canonical label, see ``app.error_labels``) merges
+    near-duplicate labels before they are counted.
+    """
+    labels = df[["question", column]].dropna()
+    tokens = as_text(labels[column]).str.lower().str.split(SEPARATOR)
+    exploded = pd.DataFrame({"question": labels["question"], "label": tokens}).explode("label")
+    exploded = exploded.dropna(subset=["label"])
+    if mapping is not None:
+        exploded["label"] = exploded["label"].map(mapping).fillna(exploded["label"])
+    return exploded
+
+
+class ErrorIndex:
+    def __init__(self, column, questions, categories, offsets, codes, counts):
+        self.column = column
+        self.categories = categories
+        self.codes = codes
+        self.counts = counts
+        self._offsets = offsets
+        self._positions = {q: i for i, q in enumerate(questions)}
+        self.questions = list(questions)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, column: str, mapping: pd.Series = None) -> "ErrorIndex":
+        exploded = explode_labels(df, column, mapping)
+        return cls.from_counts(column, exploded["question"], exploded["label"])
+
+    @classmethod
+    def from_counts(cls, column: str, questions, labels, counts=None) -> "ErrorIndex":
+        """Build from parallel (question, label) values, each weighted by ``counts`` (default 1)."""
+        q_codes, questions = pd.factorize(questions, sort=True)
+        # Unsorted factorize keeps first-appearance order, which breaks
+        # frequency ties the same way the Counter-based charts did.
+        c_codes, categories = pd.factorize(labels)
+
+        n_categories = max(len(categories), 1)
+        keys = q_codes.astype(np.int64) * n_categories + c_codes
+        if counts is None:
+            pair_codes, counts = np.unique(keys, return_counts=True)
+        else:
+            pair_codes, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(pair_codes)).astype(np.int64)
+        pair_q = pair_codes // n_categories
+        pair_c = pair_codes % n_categories
+
+        order = np.lexsort((pair_c, -counts, pair_q))
+        pair_q, pair_c, counts = pair_q[order], pair_c[order], counts[order]
+        offsets = np.searchsorted(pair_q, np.arange(len(questions) + 1))
+
+        return cls(column, list(questions), np.asarray(categories), offsets, pair_c, counts)
+
+    def __contains__(self, question):
+        return question in self._positions
+
+    def frequencies(self, question) -> pd.DataFrame:
+        """Label counts and percentages for one question, most frequent first."""
+        pos = self._positions.get(question)
+        if pos is None:
+            return pd.DataFrame(columns=["Label", "Frequency", "Percentage"])
+        start, stop = self._offsets[pos], self._offsets[pos + 1]
+        counts = self.counts[start:stop]
+        total = counts.sum()
+        return pd.DataFrame({
+            "Label": self.categories[self.codes[start:stop]],
+            "Frequency": counts,
+            "Percentage": (counts / total * 100).round(2) if total else np.zeros(len(counts)),
+        })
+
+    def crosstab(self, top: int = None) -> pd.DataFrame:
+        """Question x label counts, labels ordered by total frequency.
+
+        With ``top``, only the ``top`` most frequent labels get a column and the
+        rest are summed into "Others", so free-text columns stay small.
+        """
+        totals = np.bincount(self.codes, weights=self.counts, minlength=len(self.categories))
+        order = np.lexsort((np.arange(len(totals)), -totals))
+        kept = order if top is None else order[:top]
+        column_of = np.full(len(self.categories), len(kept))
+        column_of[kept] = np.arange(len(kept))
+
+        rows = np.repeat(np.arange(len(self.questions)), np.diff(self._offsets))
+        matrix = np.zeros((len(self.questions), len(kept) + 1), dtype=np.int64)
+        np.add.at(matrix, (rows, column_of[self.codes]), self.counts)
+        columns = list(self.categories[kept])
+        if len(kept) < len(order):
+            columns.append("Others")
+        else:
+            matrix = matrix[:, :-1]
+        return pd.DataFrame(matrix, index=pd.Index(self.questions, name="question"), columns=columns)
+
+
+# Free-text columns whose near-duplicate labels are merged before counting.
+CLUSTERED_COLUMNS = ("error_summary",)
+
+
+def error_index_for(dataset, column: str) -> ErrorIndex:
+    """Return the dataset's cached index for ``column``, building it on first use."""
+    if column not in dataset.df.columns:
+        return None
+    mapping = label_mapping_for(dataset, column) if column in CLUSTERED_COLUMNS else None
+    key = f"error_index:{column}" if mapping is None else f"error_index:{column}:{clustering_threshold()}"
+    return dataset.derive(key, lambda df: ErrorIndex.build(df, column, mapping))
@@ -0,0 +1,213 @@
+# app/error_labels.py
+"""Near-duplicate clustering of free-text error labels.
+
+Labels such as "sign error", "sign errors" and "sign eror" fragment the
+Top-N counts. Each distinct label is turned into a MinHash signature over
+its character shingles. Locality-sensitive hashing (banded signatures) then
+proposes candidate pairs, which are kept when their estimated Jaccard
+similarity reaches the threshold and their words line up (see
+``same_words``): shared words like "error" make "sine error" and "size
+error" similar as strings, yet they name different misconceptions.
+Connected labels form a cluster named after its most frequent member.
+
+Only distinct labels are hashed, and every step is a NumPy pass over
+shingles, signatures or candidate pairs, so the cost grows linearly with
+the vocabulary. Pure synonyms with little character overlap ("sign
+mistake" vs "wrong sign") are deliberately left apart.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from app.settings import get_setting
+
+DEFAULT_THRESHOLD = 0.6
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32
+# Words shorter than this must match exactly (up to a plural "s"); longer ones may carry one typo.
+MIN_TYPO_WORD = 5
+STOPWORDS = frozenset({"a", "an", "the", "of", "in", "on", "to", "for"})
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads shingle codes over the full 64-bit range."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def shingle_hashes(labels, k: int = SHINGLE_SIZE):
+    """Hash every ``k``-byte shingle of each label; returns (hashes, owner label index)."""
+    encoded = [f" {label} ".ljust(k).encode("utf-8") for label in labels]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    counts = lengths - k + 1
+    owner = np.repeat(np.arange(len(encoded)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts, counts) + (np.arange(counts.sum()) - first)
+
+    codes = np.zeros(len(positions), dtype=np.uint64)
+    for offset in range(k):
+        codes = (codes << np.uint64(8)) | buffer[positions + offset]
+    return _mix(codes), owner
+
+
+def minhash_signatures(hashes: np.ndarray, owner: np.ndarray, n_labels: int,
+                       num_perm: int = NUM_PERM, seed: int = 0) -> np.ndarray:
+    """``(n_labels, num_perm)`` MinHash signatures using multiply-shift hash permutations."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+    segment_starts = np.searchsorted(owner, np.arange(n_labels))
+
+    signatures = np.empty((n_labels, num_perm), dtype=np.uint32)
+    values = np.empty(len(hashes), dtype=np.uint64)
+    for perm in range(num_perm):
+        # In-place multiply-add-shift: one buffer reused across permutations.
+        np.multiply(hashes, a[perm], out=values)
+        values += b[perm]
+        values >>= np.uint64(32)
+        signatures[:, perm] = np.minimum.reduceat(values, segment_starts)
+    return signatures
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int = BANDS) -> np.ndarray:
+    """Label pairs sharing at least one LSH band bucket, as an ``(m, 2)`` array."""
+    n_labels, num_perm = signatures.shape
+    rows = num_perm // bands
+    weights = _mix(np.arange(1, rows + 1, dtype=np.uint64))
+    edges = []
+    for band in range(bands):
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * weights).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        group_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        leader = order[np.maximum.accumulate(np.where(group_start, np.arange(n_labels), 0))]
+        linked = ~group_start
+        edges.append(np.stack([leader[linked], order[linked]], axis=1))
+    if not edges:
+        return np.empty((0, 2), dtype=np.int64)
+    edges = np.concatenate(edges)
+    return np.unique(np.sort(edges, axis=1), axis=0) if len(edges) else edges
+
+
+def connected_components(n: int, edges: np.ndarray) -> np.ndarray:
+    """Component id (smallest member index) of each of ``n`` nodes."""
+    parent = np.arange(n)
+    if len(edges) == 0:
+        return parent
+    u, v = edges[:, 0], edges[:, 1]
+    while True:
+        pu, pv = parent[u], parent[v]
+        if np.array_equal(pu, pv):
+            return parent
+        low = np.minimum(pu, pv)
+        np.minimum.at(parent, pu, low)
+        np.minimum.at(parent, pv, low)
+        # Pointer jumping until every node points at its root.
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+
+def _plural_of(word: str, other: str) -> bool:
+    return word in (other + "s", other + "es")
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """Whether ``a`` and ``b`` differ by one insertion, deletion, substitution or adjacent swap."""
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > 1:
+        return False
+    i = 0
+    while i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) != len(b):
+        return a[i + 1:] == b[i:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+
+
+def _words(label: str) -> list:
+    words = _WORD_RE.findall(str(label).lower())
+    content = [word for word in words if word not in STOPWORDS]
+    return content or words
+
+
+def same_words(a: str, b: str) -> bool:
+    """Whether two labels are spelling variants: the same words, up to plurals and typos.
+
+    Stopwords are ignored. A typo (one edit) is only accepted in words of at
+    least ``MIN_TYPO_WORD`` letters, where it rarely turns into another word.
+    """
+    words_a, words_b = _words(a), _words(b)
+    if len(words_a) != len(words_b):
+        return False
+    for x, y in zip(words_a, words_b):
+        if x == y or _plural_of(x, y) or _plural_of(y, x):
+            continue
+        if max(len(x), len(y)) < MIN_TYPO_WORD or not _one_edit(x, y):
+            return False
+    return True
+
+
+def cluster_labels(labels, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM,
+                   bands: int = BANDS, seed: int = 0) -> np.ndarray:
+    """Cluster id per distinct label; labels whose shingle sets are ~``threshold``-similar share one."""
+    n = len(labels)
+    if n < 2:
+        return np.arange(n)
+    hashes, owner = shingle_hashes(labels)
+    signatures = minhash_signatures(hashes, owner, n, num_perm, seed)
+    pairs = candidate_pairs(signatures, bands)
+    if len(pairs):
+        agreement = np.concatenate([
+            (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+            for chunk in np.array_split(pairs, max(1, len(pairs) // 65536))
+        ])
+        pairs = pairs[agreement >= threshold]
+        # Few pairs survive the threshold, so the word check runs on those alone.
+        pairs = pairs[np.fromiter((same_words(labels[i], labels[j]) for i, j in pairs.tolist()),
+                                  dtype=bool, count=len(pairs))]
+    return connected_components(n, pairs)
+
+
+def canonical_mapping(counts: pd.Series, threshold: float = DEFAULT_THRESHOLD) -> pd.Series:
+    """Map each label in ``counts`` (label -> occurrences) to its cluster's most frequent label."""
+    counts = counts.sort_values(ascending=False, kind="stable")
+    labels = counts.index.to_numpy(dtype=object)
+    clusters = cluster_labels(labels, threshold)
+    # After the sort, the first member seen of each cluster is its most frequent one.
+    _, first = np.unique(clusters, return_index=True)
+    representative = np.empty(clusters.max() + 1 if len(clusters) else 0, dtype=object)
+    representative[clusters[first]] = labels[first]
+    return pd.Series(representative[clusters], index=labels, dtype=object)
+
+
+def clustering_threshold():
+    """Similarity threshold from ERROR_LABEL_SIMILARITY, or None when clustering is off (0)."""
+    threshold = float(get_setting("ERROR_LABEL_SIMILARITY", DEFAULT_THRESHOLD))
+    return threshold if threshold > 0 else None
+
+
+def label_mapping_for(dataset, column: str = "error_summary"):
+    """The dataset's cached canonical-label mapping for ``column``, or None when disabled."""
+    # Imported here: app.error_index applies these mappings and imports this module.
+    from app.error_index import explode_labels
+
+    threshold = clustering_threshold()
+    if threshold is None or column not in dataset.df.columns:
+        return None
+    return dataset.derive(
+        f"label_mapping:{column}:{threshold}",
+        lambda df: canonical_mapping(explode_labels(df, column)["label"].value_counts(sort=False), threshold),
+    )
@@ -0,0 +1,65 @@
+# app/figure_cache.py
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from app.settings import get_setting
+
+DEFAULT_BUDGET_MB = 64
+
+
+class FigureCache:
+    """LRU cache of rendered chart PNGs, bounded by total bytes.
+
+    Keys combine the dataset content hash, the chart name and the chart's
+    parameters, so a rerun that leaves a chart's inputs unchanged serves the
+    stored image instead of redrawing it.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png: bytes):
+        if len(png) > self.budget_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = png
+            self._bytes += len(png)
+            while self._bytes > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "figures": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache() -> FigureCache:
+    budget_mb = float(get_setting("FIGURE_CACHE_MB", DEFAULT_BUDGET_MB))
+    return FigureCache(int(budget_mb * 1024 * 1024))
@@ -0,0 +1,140 @@
+# app/ingest.py
+"""Memory-lean CSV ingestion.
+
+Required columns are checked from the header alone, then the file is read
+in blocks with pyarrow's streaming CSV reader. ``question`` and
+``student_id`` become categoricals and the long free-text columns stay in
+Arrow-backed strings instead of one Python object per cell.
+"""
+import csv
+import io
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+CATEGORICAL_COLUMNS = ("question", "student_id")
+TEXT_COLUMNS = ("llm_response", "error_summary", "error_category")
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, missing):
+        self.missing = list(missing)
+        super().__init__(f"Missing required columns: {', '.join(self.missing)}")
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else open(source, "rb")
+
+
+def read_header(source) -> list:
+    """Return the column names of a CSV given as bytes or a path, reading only the first record."""
+    with _open(source) as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        return next(csv.reader(text), [])
+
+
+def validate_columns(source, required) -> list:
+    """Raise ``MissingColumnsError`` unless the header contains every ``required`` column."""
+    columns = read_header(source)
+    missing = [col for col in required if col not in columns]
+    if missing:
+        raise MissingColumnsError(missing)
+    return columns
+
+
+def as_text(series: pd.Series) -> pd.Series:
+    """Return ``series`` as strings, keeping Arrow-backed text as it is."""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    return series.astype("string[pyarrow]")
+
+
+def _max_rss_bytes():
+    """Peak resident memory of this process, or None where ``resource`` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _types_mapper(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _read_blocks(source, columns, block_size, report) -> pa.Table:
+    # Types are fixed from the first block, so pin the columns whose later
+    # blocks could otherwise disagree with that inference (e.g. a first block
+    # of empty error summaries). ID columns keep their inferred type.
+    column_types = {col: pa.string() for col in TEXT_COLUMNS if col in columns}
+    if "grade" in columns:
+        column_types["grade"] = pa.float64()
+
+    pool = pa.default_memory_pool()
+    batches = []
+    with _open(source) as raw:
+        reader = pacsv.open_csv(
+            raw,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(column_types=column_types),
+        )
+        for batch in reader:
+            columns_out = []
+            for name, array in zip(batch.schema.names, batch.columns):
+                if name in CATEGORICAL_COLUMNS:
+                    array = array.dictionary_encode()
+                columns_out.append(array)
+            batches.append(pa.RecordBatch.from_arrays(columns_out, names=batch.schema.names))
+            report["chunks"] += 1
+            report["peak_arrow_bytes"] = max(report["peak_arrow_bytes"], pool.bytes_allocated())
+
+    if not batches:
+        return reader.schema.empty_table()
+    return pa.Table.from_batches(batches).unify_dictionaries()
+
+
+def read_csv(source, required=(), block_size: int = DEFAULT_BLOCK_SIZE):
+    """Read a CSV (bytes or path) into a compact DataFrame.
+
+    Returns ``(df, report)`` where ``report`` holds the row and chunk
+    counts, load time, the frame's memory footprint and the peak Arrow
+    allocation observed while reading.
+    """
+    start = time.perf_counter()
+    columns = validate_columns(source, required)
+    report = {"rows": 0, "chunks": 0, "peak_arrow_bytes": 0}
+
+    try:
+        table = _read_blocks(source, columns, block_size, report)
+    except pa.ArrowInvalid:
+        # A value the pinned types can't hold (e.g. a non-numeric grade):
+        # fall back to whole-file inference and coerce afterwards.
+        with _open(source) as raw:
+            table = pa.Table.from_pandas(pd.read_csv(raw, engine="pyarrow"), preserve_index=False)
+        report["chunks"] = 1
+
+    df = table.to_pandas(types_mapper=_types_mapper, split_blocks=True, self_destruct=True)
+    del table
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            values = df[col].astype("category")
+            # Sorted categories keep groupby/factorize order the same as for plain columns.
+            df[col] = values.cat.reorder_categories(values.cat.categories.sort_values())
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = as_text(df[col])
+
+    report.update(
+        rows=len(df),
+        seconds=time.perf_counter() - start,
+        frame_bytes=int(df.memory_usage(deep=True).sum()),
+        max_rss_bytes=_max_rss_bytes(),
+    )
+    return df, report
@@ -0,0 +1,139 @@
+# app/instrumentation.py
+"""Lightweight per-session span recording.
+
+``span`` times a block and stores a small dict (name, run, duration and any
+attributes such as rows, tokens or cache hits) in a bounded per-session
+buffer. Outside a Streamlit script run (CLI tools, benchmarks) spans are
+no-ops, and recording can be switched off with PERF_INSTRUMENTATION=false.
+"""
+import functools
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from app.settings import get_setting
+
+MAX_SPANS = 1000
+_STATE_KEY = "_perf_recorder"
+
+
+class SpanRecorder:
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.run_id = 0
+        self._open = []
+
+    def begin_run(self):
+        self.run_id += 1
+        self._open.clear()
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(list(self.spans))
+
+
+def _enabled() -> bool:
+    return str(get_setting("PERF_INSTRUMENTATION", "true")).lower() not in ("0", "false", "no")
+
+
+def get_recorder():
+    """Return the current session's recorder, or None outside a script run."""
+    if get_script_run_ctx(suppress_warning=True) is None or not _enabled():
+        return None
+    recorder = st.session_state.get(_STATE_KEY)
+    if recorder is None:
+        recorder = st.session_state[_STATE_KEY] = SpanRecorder()
+    return recorder
+
+
+def begin_run():
+    """Mark the start of a rerun so spans can be grouped per rerun."""
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.begin_run()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block; the yielded dict can be filled with extra attributes."""
+    recorder = get_recorder()
+    record = dict(attrs)
+    if recorder is None:
+        yield record
+        return
+
+    recorder._open.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        # By identity: nested spans can carry equal dicts. A rerun may have cleared it already.
+        for i in range(len(recorder._open) - 1, -1, -1):
+            if recorder._open[i] is record:
+                del recorder._open[i]
+                break
+        recorder.spans.append({"run": recorder.run_id, "span": name, "duration_ms": round(duration_ms, 3), **record})
+
+
+def record_span(name: str, duration_ms: float, **attrs):
+    """Record an already-measured span, e.g. one spanning a generator's lifetime."""
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.spans.append({"run": recorder.run_id, "span": name, "duration_ms": round(duration_ms, 3), **attrs})
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    recorder = get_recorder()
+    if recorder is not None and recorder._open:
+        recorder._open[-1].update(attrs)
+
+
+def traced(name: str):
+    """Decorator recording a span per call, with ``rows`` taken from a DataFrame first argument."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rows = args[0].shape[0] if args and hasattr(args[0], "columns") else None
+            with span(name, rows=rows):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_perf_panel():
+    """Sidebar panel with recent spans, per-span summaries and JSON/CSV export."""
+    recorder = get_recorder()
+    if recorder is None or not st.sidebar.toggle("📈 Performance panel", key="show_perf_panel"):
+        return
+
+    with st.sidebar:
+        spans = recorder.to_frame()
+        if spans.empty:
+            st.caption("No spans recorded yet.")
+            return
+
+        last_run = spans[spans["run"] == spans["run"].max()]
+        st.caption(f"Last rerun: {last_run['duration_ms'].sum():.0f} ms across {len(last_run)} spans")
+        summary = (
+            spans.groupby("span")["duration_ms"]
+            .agg(count="count", mean_ms="mean", p95_ms=lambda d: d.quantile(0.95), max_ms="max")
+            .round(1)
+            .sort_values("mean_ms", ascending=False)
+        )
+        st.dataframe(summary)
+        with st.expander("Recent spans"):
+            st.dataframe(spans.tail(50).iloc[::-1], hide_index=True)
+
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "JSON", data=spans.to_json(orient="records"), file_name="perf_spans.json", mime="application/json"
+        )
+        col2.download_button("CSV", data=spans.to_csv(index=False), file_name="perf_spans.csv", mime="text/csv")
+        if st.button("Clear spans"):
+            recorder.spans.clear()
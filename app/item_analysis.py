@@ -0,0 +1,121 @@
+# app/item_analysis.py
+"""Classical item analysis without Streamlit.
+
+Difficulty, upper/lower-group discrimination and point-biserial correlation
+are computed for every question at once from integer-coded arrays, so the
+cost is a handful of ``bincount`` passes rather than one scan per question.
+"""
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ["question", "grade", "student_id"]
+GROUP_FRACTION = 0.27
+
+STAT_COLUMNS = [
+    "question",
+    "sum_fx",
+    "n",
+    "difficulty_index",
+    "discrimination_index",
+    "point_biserial",
+]
+
+
+def prepare_responses(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the scoring columns and drop rows without a numeric grade."""
+    responses = df[REQUIRED_COLUMNS].dropna()
+    responses = responses.assign(grade=pd.to_numeric(responses["grade"], errors="coerce"))
+    return responses.dropna(subset=["grade"])
+
+
+def aggregate_pairs(responses: pd.DataFrame) -> pd.DataFrame:
+    """Collapse responses to one row per (question, student).
+
+    The result holds every sum the item statistics need, so it can also be
+    maintained incrementally as new grading batches arrive.
+    """
+    q_codes, questions = pd.factorize(responses["question"], sort=True)
+    s_codes, students = pd.factorize(responses["student_id"], sort=True)
+    grades = responses["grade"].to_numpy(dtype=float)
+
+    pair_codes = q_codes.astype(np.int64) * max(len(students), 1) + s_codes
+    unique_pairs, inverse = np.unique(pair_codes, return_inverse=True)
+    n_pairs = len(unique_pairs)
+
+    return pd.DataFrame({
+        "question": questions.take(unique_pairs // max(len(students), 1)),
+        "student_id": students.take(unique_pairs % max(len(students), 1)),
+        "n": np.bincount(inverse, minlength=n_pairs),
+        "grade_sum": np.bincount(inverse, weights=grades, minlength=n_pairs),
+        "grade_sq_sum": np.bincount(inverse, weights=grades * grades, minlength=n_pairs),
+        "n_pos": np.bincount(inverse, weights=grades > 0, minlength=n_pairs),
+    })
+
+
+def _point_biserial(n, sx, sy, sxy, sxx, syy):
+    cov = n * sxy - sx * sy
+    var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = cov / np.sqrt(var)
+    return np.where(var > 0, r, np.nan)
+
+
+def item_statistics_from_pairs(pairs: pd.DataFrame, group_fraction: float = GROUP_FRACTION) -> pd.DataFrame:
+    """Compute per-question item statistics from ``aggregate_pairs`` output."""
+    if pairs.empty:
+        return pd.DataFrame(columns=STAT_COLUMNS)
+
+    q_codes, questions = pd.factorize(pairs["question"], sort=True)
+    s_codes, students = pd.factorize(pairs["student_id"], sort=True)
+    n_questions, n_students = len(questions), len(students)
+
+    n = pairs["n"].to_numpy(dtype=float)
+    grade_sum = pairs["grade_sum"].to_numpy(dtype=float)
+    n_pos = pairs["n_pos"].to_numpy(dtype=float)
+
+    totals = np.bincount(s_codes, weights=grade_sum, minlength=n_students)
+
+    # Rank students by total grade; the top and bottom 27% form the groups.
+    group_size = int(np.ceil(n_students * group_fraction))
+    rank = np.empty(n_students, dtype=np.int64)
+    rank[np.argsort(-totals, kind="stable")] = np.arange(n_students)
+    upper = (rank < group_size)[s_codes]
+    lower = (rank >= n_students - group_size)[s_codes]
+
+    def per_question(weights):
+        return np.bincount(q_codes, weights=weights, minlength=n_questions)
+
+    count = per_question(n)
+    sum_fx = per_question(grade_sum)
+    upper_pos = per_question(n_pos * upper)
+    lower_pos = per_question(n_pos * lower)
+
+    pair_totals = totals[s_codes]
+    point_biserial = _point_biserial(
+        count,
+        sum_fx,
+        per_question(n * pair_totals),
+        per_question(grade_sum * pair_totals),
+        per_question(pairs["grade_sq_sum"].to_numpy(dtype=float)),
+        per_question(n * pair_totals * pair_totals),
+    )
+
+    return pd.DataFrame({
+        "question": np.asarray(questions),
+        "sum_fx": sum_fx,
+        "n": count.astype(np.int64),
+        "difficulty_index": sum_fx / count,
+        "discrimination_index": (upper_pos - lower_pos) / max(group_size, 1),
+        "point_biserial": point_biserial,
+    })
+
+
+def item_statistics(df: pd.DataFrame, group_fraction: float = GROUP_FRACTION) -> pd.DataFrame:
+    """Return one row per question with difficulty, discrimination and point-biserial.
+
+    Raises ``KeyError`` when the scoring columns are missing.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise KeyError(f"Missing required columns: {', '.join(missing)}")
+    return item_statistics_from_pairs(aggregate_pairs(prepare_responses(df)), group_fraction)
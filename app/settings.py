@@ -0,0 +1,18 @@
+# app/settings.py
+import os
+
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    """Read a setting from the environment first, then Streamlit secrets.
+
+    Missing secrets files are tolerated so the same code runs headless
+    (CLI tools, benchmarks) and inside the Streamlit server.
+    """
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        return default
@@ -0,0 +1,442 @@
+# app/stats_store.py
+"""Running item and error statistics that grow with appended grading batches.
+
+A ``StatsStore`` keeps the sufficient statistics behind the dashboard:
+per-(question, student) grade sums from ``aggregate_pairs``, grade value
+tallies (overall and per overlay group) and per-question error label
+tallies. Appending a batch aggregates
+only that batch and adds it into the running totals, so the cost follows
+the batch size. Each batch's aggregates are also written to the state
+directory, so a restart replays small delta files instead of re-reading
+every batch.
+
+With ``BATCH_WATCH_DIR`` set, new CSVs dropped into that directory are
+appended to the default dataset's store as they arrive.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from app.analytics import GRADE_OVERLAY_COLUMNS, grade_counts
+from app.bootstrap import DEFAULT_RESAMPLES, bootstrap_intervals
+from app.error_index import CLUSTERED_COLUMNS, ErrorIndex, explode_labels
+from app.error_labels import canonical_mapping, clustering_threshold
+from app.ingest import read_csv
+from app.item_analysis import (
+    GROUP_FRACTION,
+    REQUIRED_COLUMNS,
+    aggregate_pairs,
+    item_statistics_from_pairs,
+    prepare_responses,
+)
+from app.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = ".cache/stats"
+DEFAULT_SETTLE_S = 1.0
+ERROR_COLUMNS = ("error_summary", "error_category")
+PAIR_SUMS = ("n", "grade_sum", "grade_sq_sum", "n_pos")
+GROUP_GRADE_COLUMNS = ["column", "group", "grade", "count"]
+AGGREGATES = ("pairs", "grades", "group_grades", "errors")
+_MANIFEST = "manifest.json"
+
+
+def batch_aggregates(df: pd.DataFrame) -> dict:
+    """Aggregate one batch into the frames a ``StatsStore`` adds up."""
+    if all(col in df.columns for col in REQUIRED_COLUMNS):
+        responses = prepare_responses(df)
+        pairs = aggregate_pairs(responses)
+        grades = responses["grade"].value_counts(sort=False)
+    else:
+        pairs = pd.DataFrame(columns=["question", "student_id", *PAIR_SUMS])
+        grades = pd.Series(dtype=np.int64)
+
+    errors = []
+    for column in ERROR_COLUMNS:
+        if column in df.columns and "question" in df.columns:
+            exploded = explode_labels(df, column)
+            # sort=False keeps first-appearance order for ErrorIndex tie-breaking.
+            counts = exploded.groupby(["question", "label"], sort=False, observed=True).size()
+            errors.append(counts.rename("count").reset_index().assign(column=column))
+    errors = pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(
+        columns=["question", "label", "count", "column"]
+    )
+
+    group_grades = []
+    if "grade" in df.columns:
+        for column in GRADE_OVERLAY_COLUMNS:
+            if column in df.columns:
+                counts = grade_counts(df, column).rename("count").reset_index()
+                # Groups are kept as strings so every column fits one parquet column.
+                group_grades.append(counts.assign(column=column, group=counts["group"].astype(str)))
+    group_grades = (
+        pd.concat(group_grades, ignore_index=True)[GROUP_GRADE_COLUMNS] if group_grades
+        else pd.DataFrame(columns=GROUP_GRADE_COLUMNS)
+    )
+    return {
+        "pairs": pairs,
+        "grades": pd.DataFrame({"grade": grades.index.to_numpy(dtype=float), "count": grades.to_numpy()}),
+        "group_grades": group_grades,
+        "errors": errors,
+    }
+
+
+class StatsStore:
+    def __init__(self, state_dir: str = None):
+        self.state_dir = state_dir
+        self.version = 0
+        self.sources = []
+        self._lock = threading.RLock()
+        self._memo = {}
+
+        self._question_codes = {}
+        self._student_codes = {}
+        self._pair_rows = {}
+        self._q_code = np.zeros(0, dtype=np.int64)
+        self._s_code = np.zeros(0, dtype=np.int64)
+        self._sums = np.zeros((0, len(PAIR_SUMS)))
+        self._n_pairs = 0
+        self._grade_counts = {}
+        self._group_grade_counts = {column: {} for column in GRADE_OVERLAY_COLUMNS}
+        self._error_counts = {column: {} for column in ERROR_COLUMNS}
+
+    # --- Updates ---
+    def append(self, df: pd.DataFrame, source: str = None, persist: bool = True) -> bool:
+        """Add a batch; returns False if ``source`` was already appended."""
+        with self._lock:
+            if source is not None and source in self.sources:
+                return False
+        aggregates = batch_aggregates(df)
+        with self._lock:
+            if source is not None and source in self.sources:
+                return False
+            self._apply(aggregates)
+            if source is not None:
+                self.sources.append(source)
+                if persist and self.state_dir:
+                    self._persist(aggregates, source)
+        return True
+
+    def _codes(self, mapping, values) -> np.ndarray:
+        return np.fromiter((mapping.setdefault(v, len(mapping)) for v in values), dtype=np.int64, count=len(values))
+
+    def _grow(self, needed: int):
+        capacity = len(self._q_code)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+        for name in ("_q_code", "_s_code"):
+            grown = np.zeros(capacity, dtype=np.int64)
+            grown[:self._n_pairs] = getattr(self, name)[:self._n_pairs]
+            setattr(self, name, grown)
+        sums = np.zeros((capacity, len(PAIR_SUMS)))
+        sums[:self._n_pairs] = self._sums[:self._n_pairs]
+        self._sums = sums
+
+    def _apply(self, aggregates: dict):
+        pairs = aggregates["pairs"]
+        q_codes = self._codes(self._question_codes, pairs["question"].tolist())
+        s_codes = self._codes(self._student_codes, pairs["student_id"].tolist())
+
+        rows = np.empty(len(pairs), dtype=np.int64)
+        new_rows = []
+        for i, key in enumerate(zip(q_codes.tolist(), s_codes.tolist())):
+            row = self._pair_rows.get(key)
+            if row is None:
+                row = self._pair_rows[key] = self._n_pairs + len(new_rows)
+                new_rows.append(i)
+            rows[i] = row
+        if new_rows:
+            self._grow(self._n_pairs + len(new_rows))
+            added = slice(self._n_pairs, self._n_pairs + len(new_rows))
+            self._q_code[added] = q_codes[new_rows]
+            self._s_code[added] = s_codes[new_rows]
+            self._n_pairs += len(new_rows)
+        np.add.at(self._sums, rows, pairs[list(PAIR_SUMS)].to_numpy(dtype=float))
+
+        for grade, count in zip(aggregates["grades"]["grade"].tolist(), aggregates["grades"]["count"].tolist()):
+            self._grade_counts[grade] = self._grade_counts.get(grade, 0) + count
+        group_grades = aggregates["group_grades"]
+        for column, group, grade, count in zip(
+            group_grades["column"].tolist(), group_grades["group"].tolist(), group_grades["grade"].tolist(),
+            group_grades["count"].tolist()
+        ):
+            tally = self._group_grade_counts[column]
+            tally[(group, grade)] = tally.get((group, grade), 0) + count
+        errors = aggregates["errors"]
+        for column, question, label, count in zip(
+            errors["column"].tolist(), errors["question"].tolist(), errors["label"].tolist(), errors["count"].tolist()
+        ):
+            tally = self._error_counts[column]
+            tally[(question, label)] = tally.get((question, label), 0) + count
+
+        self.version += 1
+        self._memo.clear()
+
+    # --- Persistence ---
+    def _persist(self, aggregates: dict, source: str):
+        seq = len(self.sources)
+        os.makedirs(self.state_dir, exist_ok=True)
+        for name, frame in aggregates.items():
+            frame.to_parquet(os.path.join(self.state_dir, f"{seq:06d}-{name}.parquet"), index=False)
+        manifest = os.path.join(self.state_dir, _MANIFEST)
+        with open(manifest + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump({"sources": self.sources}, fh)
+        os.replace(manifest + ".tmp", manifest)
+
+    def load(self) -> int:
+        """Replay the batches persisted in ``state_dir``; returns how many were applied."""
+        manifest = os.path.join(self.state_dir or "", _MANIFEST)
+        if not self.state_dir or not os.path.exists(manifest):
+            return 0
+        with open(manifest, encoding="utf-8") as fh:
+            sources = json.load(fh)["sources"]
+        for seq, source in enumerate(sources, start=1):
+            aggregates = {}
+            for name in AGGREGATES:
+                path = os.path.join(self.state_dir, f"{seq:06d}-{name}.parquet")
+                if name == "group_grades" and not os.path.exists(path):
+                    # Batches persisted before per-group grade tallies were kept.
+                    aggregates[name] = pd.DataFrame(columns=GROUP_GRADE_COLUMNS)
+                else:
+                    aggregates[name] = pd.read_parquet(path)
+            with self._lock:
+                self._apply(aggregates)
+                self.sources.append(source)
+        return len(sources)
+
+    # --- Views (memoized per version) ---
+    def _memoized(self, name, builder):
+        with self._lock:
+            key = (self.version, name)
+            if key not in self._memo:
+                self._memo[key] = builder()
+            return self._memo[key]
+
+    @staticmethod
+    def _sorted_categorical(mapping, codes) -> pd.Categorical:
+        values = pd.Index(list(mapping))
+        order = values.argsort()
+        remap = np.empty(len(values), dtype=np.int64)
+        remap[order] = np.arange(len(values))
+        return pd.Categorical.from_codes(remap[codes], categories=values[order])
+
+    def pairs(self) -> pd.DataFrame:
+        """The running per-(question, student) sums, shaped like ``aggregate_pairs`` output."""
+        def build():
+            n = self._n_pairs
+            frame = pd.DataFrame({
+                "question": self._sorted_categorical(self._question_codes, self._q_code[:n]),
+                "student_id": self._sorted_categorical(self._student_codes, self._s_code[:n]),
+            })
+            for i, name in enumerate(PAIR_SUMS):
+                frame[name] = self._sums[:n, i]
+            return frame
+        return self._memoized("pairs", build)
+
+    def item_statistics(self, group_fraction: float = GROUP_FRACTION) -> pd.DataFrame:
+        return self._memoized(("item_statistics", group_fraction),
+                              lambda: item_statistics_from_pairs(self.pairs(), group_fraction))
+
+    def bootstrap_intervals(self, n_resamples: int = DEFAULT_RESAMPLES, workers: int = 0) -> pd.DataFrame:
+        return self._memoized(("bootstrap", n_resamples),
+                              lambda: bootstrap_intervals(self.pairs(), n_resamples, workers=workers))
+
+    def grade_counts(self, by: str = None) -> pd.Series:
+        """Responses per grade value, or per (``by`` group, grade) pair like ``analytics.grade_counts``.
+
+        ``by`` is one of ``GRADE_OVERLAY_COLUMNS``; its groups are strings.
+        """
+        if by is None:
+            return self._memoized("grade_counts", lambda: pd.Series(self._grade_counts, dtype=np.int64).sort_index())
+
+        def build():
+            tally = self._group_grade_counts.get(by, {})
+            index = pd.MultiIndex.from_tuples(list(tally), names=["group", "grade"])
+            return pd.Series(list(tally.values()), index=index, dtype=np.int64).sort_index()
+        return self._memoized(("grade_counts", by), build)
+
+    def error_index(self, column: str) -> ErrorIndex:
+        def build():
+            tally = self._error_counts[column]
+            labels = pd.Series([label for _, label in tally], dtype=object)
+            counts = np.fromiter(tally.values(), dtype=float, count=len(tally))
+            threshold = clustering_threshold()
+            if column in CLUSTERED_COLUMNS and threshold is not None and len(labels):
+                mapping = canonical_mapping(pd.Series(counts).groupby(labels, sort=False).sum(), threshold)
+                labels = labels.map(mapping)
+            return ErrorIndex.from_counts(
+                column, pd.Series([question for question, _ in tally], dtype=object), labels, counts
+            )
+        return self._memoized(("error_index", column), build)
+
+    @property
+    def questions(self) -> list:
+        with self._lock:
+            return sorted(self._question_codes)
+
+
+def _file_size(path: str):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _parse_source(source: str):
+    """``(name, size, digest)`` of a watched-file source; the digest is "" for older ``name:size`` ones."""
+    parts = source.rsplit(":", 2)
+    if len(parts) == 3 and parts[1].isdigit() and len(parts[2]) == 16:
+        return parts[0], int(parts[1]), parts[2]
+    name, _, size = source.rpartition(":")
+    return (name, int(size), "") if size.isdigit() else (None, 0, "")
+
+
+class BatchWatcher:
+    """Append every CSV written, grown or moved into ``directory`` to ``store``.
+
+    Not every watchdog backend reports closed files (only inotify does), so
+    created and modified events are handled too: the file is ingested once
+    its size has not changed for ``settle_s``. Each ingested file is
+    recorded as ``name:end:digest``, the digest covering its first ``end``
+    bytes. A file that grows therefore only has its new rows appended, a
+    file replaced with different content is ingested again, and one moved or
+    copied under another name is not.
+    """
+
+    def __init__(self, store: StatsStore, directory: str, required=REQUIRED_COLUMNS,
+                 settle_s: float = DEFAULT_SETTLE_S, observer=None):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self.store = store
+        self.directory = directory
+        self.required = required
+        self.settle_s = settle_s
+        self._timers = {}
+        self._timers_lock = threading.Lock()
+        self._ingest_lock = threading.Lock()
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                watcher.schedule(event.src_path)
+
+            def on_modified(self, event):
+                watcher.schedule(event.src_path)
+
+            def on_closed(self, event):
+                watcher.ingest(event.src_path)
+
+            def on_moved(self, event):
+                watcher.ingest(event.dest_path)
+
+        self._observer = observer or Observer()
+        self._observer.schedule(_Handler(), directory, recursive=False)
+
+    def start(self):
+        # Catch up on batches written while the app was not running.
+        for name in sorted(os.listdir(self.directory)):
+            self.ingest(os.path.join(self.directory, name))
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop(self):
+        self._observer.stop()
+        with self._timers_lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+
+    def schedule(self, path: str):
+        """Ingest ``path`` once its size has been stable for ``settle_s``."""
+        if not path.endswith(".csv"):
+            return
+        with self._timers_lock:
+            previous = self._timers.get(path)
+            if previous is not None:
+                previous.cancel()
+            timer = threading.Timer(self.settle_s, self._settle, (path, _file_size(path)))
+            timer.daemon = True
+            self._timers[path] = timer
+            timer.start()
+
+    def _settle(self, path: str, size):
+        with self._timers_lock:
+            if self._timers.get(path) is threading.current_thread():
+                del self._timers[path]
+        if _file_size(path) != size:
+            self.schedule(path)  # Still being written.
+            return
+        self.ingest(path)
+
+    def _ingested_end(self, name: str, data: bytes) -> int:
+        """Length of the longest prefix of ``data`` already appended (0 for new content)."""
+        end, digests = 0, {}
+        for source in list(self.store.sources):
+            source_name, size, digest = _parse_source(source)
+            if source_name is None or size <= end or size > len(data):
+                continue
+            if digest:
+                if size not in digests:
+                    digests[size] = _digest(data[:size])
+                if digests[size] != digest:
+                    continue
+            elif source_name != name:
+                # Sources without a digest predate it: trust them by name only.
+                continue
+            end = size
+        return end
+
+    def ingest(self, path: str) -> bool:
+        """Append the rows of ``path`` not appended yet; True if there were any."""
+        if not path.endswith(".csv") or not os.path.isfile(path):
+            return False
+        name = os.path.basename(path)
+        with self._ingest_lock:
+            try:
+                with open(path, "rb") as fh:
+                    data = fh.read()
+            except OSError as exc:
+                logger.warning("Skipping batch %s: %s", path, exc)
+                return False
+            start = self._ingested_end(name, data)
+            if start >= len(data):
+                return False
+            # Only the rows appended since, under the file's header.
+            chunk = data[:data.find(b"\n") + 1] + data[start:] if start else data
+            try:
+                df, _ = read_csv(chunk, required=self.required)
+            except Exception as exc:
+                logger.warning("Skipping batch %s: %s", path, exc)
+                return False
+            return self.store.append(df, source=f"{name}:{len(data)}:{_digest(data)}")
+
+
+@st.cache_resource(show_spinner=False)
+def _get_stats_store(dataset_key: str, watch_dir: str, _df: pd.DataFrame) -> StatsStore:
+    store = StatsStore(state_dir=os.path.join(get_setting("STATS_STATE_DIR", DEFAULT_STATE_DIR), dataset_key))
+    store.append(_df)
+    store.load()
+    BatchWatcher(store, watch_dir).start()
+    return store
+
+
+def stats_store_for(dataset):
+    """The dataset's incremental store when ``BATCH_WATCH_DIR`` is configured, else None."""
+    watch_dir = get_setting("BATCH_WATCH_DIR")
+    if not watch_dir or not os.path.isdir(watch_dir):
+        return None
+    return _get_stats_store(dataset.key, os.path.abspath(watch_dir), dataset.df)
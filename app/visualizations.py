@@ -1,71 +1,122 @@
 # app/visualizations.py
+import io
+
 import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
 import numpy as np
-from collections import Counter
 
-def grade_distribution(df):
+from app import analytics
+from app.figure_cache import get_figure_cache
+from app.instrumentation import annotate, traced
+
+# matplotlib is imported inside the chart functions, after the figure cache
+# lookup: cached charts and pages without plots never load it.
+
+# Same savefig options st.pyplot uses, so cached images look identical.
+_SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200, "format": "png"}
+MAX_GRADE_OVERLAYS = 8
+
+
+def _show_cached(cache_key, chart, *params):
+    """Display a previously rendered chart; returns False on a cache miss."""
+    if cache_key is None:
+        return False
+    png = get_figure_cache().get((cache_key, chart, params))
+    annotate(figure_cache_hit=png is not None)
+    if png is None:
+        return False
+    st.image(png, width="stretch")
+    return True
+
+
+def _show(fig, cache_key, chart, *params):
+    """Render ``fig`` to PNG, remember it under the chart's key and display it."""
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, **_SAVEFIG_OPTIONS)
+    plt.close(fig)
+    png = buffer.getvalue()
+    if cache_key is not None:
+        get_figure_cache().put((cache_key, chart, params), png)
+    st.image(png, width="stretch")
+
+
+@traced("chart:grade_distribution")
+def grade_distribution(df, cache_key=None, grade_counts=None, overlay=None, group_counts=None):
+    """Grade histogram with a binned KDE; ``overlay`` (a column) adds one density line per group.
+
+    Everything is drawn from per-grade counts (``grade_counts`` and
+    ``group_counts`` when the incremental store provides them), so render
+    time does not grow with rows.
+    """
     if "grade" not in df.columns:
         st.warning("Column 'grade' is required for grade distribution visualization.")
         return
+    if _show_cached(cache_key, "grade_distribution", overlay):
+        return
+
+    counts = analytics.grade_counts(df) if grade_counts is None else grade_counts
+    histogram = analytics.histogram_from_counts(counts, bins=10)
+    if histogram.empty:
+        st.info("No numeric grades available to visualize.")
+        return
+    bin_width = float(histogram["bin_right"].iloc[0] - histogram["bin_left"].iloc[0]) or 1.0
 
-    df['grade'] = pd.to_numeric(df['grade'], errors='coerce')
-    df = df.dropna(subset=["grade"])
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(figsize=(8, 5))
-    sns.histplot(df['grade'], bins=10, kde=True, ax=ax)
-    ax.set_title("Grade Distribution")
+    ax.bar(histogram["bin_left"], histogram["count"], width=histogram["bin_right"] - histogram["bin_left"],
+           align="edge", color="C0", alpha=0.6, edgecolor="white")
+    # Densities are scaled to counts per bin so the curves sit on the bars.
+    kde = analytics.binned_kde(counts.index, counts.to_numpy())
+    ax.plot(kde["x"], kde["density"] * counts.sum() * bin_width, color="C0", linewidth=2, label="All")
+
+    if overlay is not None:
+        by_group = analytics.grade_counts(df, overlay) if group_counts is None else group_counts
+        sizes = by_group.groupby(level=0, observed=True).sum().sort_values(ascending=False, kind="stable")
+        for i, group in enumerate(sizes.index[:MAX_GRADE_OVERLAYS]):
+            tally = by_group.loc[group]
+            kde = analytics.binned_kde(tally.index, tally.to_numpy())
+            ax.plot(kde["x"], kde["density"] * sizes[group] * bin_width, color=f"C{i + 1}", linewidth=1.2,
+                    label=str(group))
+        title = f"Grade Distribution by {overlay}"
+        if len(sizes) > MAX_GRADE_OVERLAYS:
+            title += f" ({MAX_GRADE_OVERLAYS} largest of {len(sizes)})"
+        ax.set_title(title)
+        ax.legend(fontsize=8)
+    else:
+        ax.set_title("Grade Distribution")
     ax.set_xlabel("Grade")
     ax.set_ylabel("Frequency")
     ax.grid(True)
     fig.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig, cache_key, "grade_distribution", overlay)
 
-def difficulty_discrimination(df):
+@traced("chart:difficulty_discrimination")
+def difficulty_discrimination(df, cache_key=None, stats=None, intervals=None):
+    """Bar chart of both indices; ``intervals`` (see ``app.bootstrap``) adds confidence error bars."""
     if not all(col in df.columns for col in ["question", "grade", "student_id"]):
         st.warning("Dataset must include 'question', 'grade', and 'student_id' columns.")
         return
+    if _show_cached(cache_key, "difficulty_discrimination", intervals is not None):
+        return
 
-    df = df.dropna(subset=["question", "grade", "student_id"])
-    df["grade"] = pd.to_numeric(df["grade"], errors='coerce')
-    df = df.dropna(subset=["grade"])
-
-    difficulty_indices = (
-        df.groupby("question")["grade"]
-        .agg(["sum", "count"])
-        .rename(columns={"sum": "sum_fx", "count": "n"})
-    )
-    difficulty_indices["difficulty_index"] = difficulty_indices["sum_fx"] / difficulty_indices["n"]
-    difficulty_indices = difficulty_indices.reset_index()
-
-    total_grade_per_student = df.groupby("student_id")["grade"].sum().reset_index()
-    total_grade_per_student = total_grade_per_student.sort_values(by="grade", ascending=False)
-
-    n_students = len(total_grade_per_student)
-    group_size = int(np.ceil(n_students * 0.27))
-
-    if group_size < 1:
+    analysis_results = analytics.item_statistics(df) if stats is None else stats
+    if analysis_results.empty:
         st.warning("Not enough students to compute discrimination index.")
         return
 
-    upper_group_ids = total_grade_per_student.head(group_size)["student_id"]
-    lower_group_ids = total_grade_per_student.tail(group_size)["student_id"]
-
-    def discrimination_index(q_df):
-        up = q_df[q_df["student_id"].isin(upper_group_ids) & (q_df["grade"] > 0)].shape[0]
-        lp = q_df[q_df["student_id"].isin(lower_group_ids) & (q_df["grade"] > 0)].shape[0]
-        return (up - lp) / group_size
+    errors = {}
+    if intervals is not None:
+        merged = analysis_results.merge(intervals, on="question", how="left")
+        for name in ("difficulty", "discrimination"):
+            estimate = merged[f"{name}_index"].to_numpy()
+            errors[name] = np.nan_to_num(np.vstack([
+                estimate - merged[f"{name}_low"].to_numpy(),
+                merged[f"{name}_high"].to_numpy() - estimate,
+            ]).clip(min=0))
 
-    discrimination_results = (
-        df.groupby("question")
-        .apply(discrimination_index)
-        .reset_index(name="discrimination_index")
-    )
-
-    analysis_results = pd.merge(difficulty_indices, discrimination_results, on="question")
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(figsize=(10, 6))
     x = np.arange(len(analysis_results["question"]))
@@ -76,6 +127,8 @@ def difficulty_discrimination(df):
         analysis_results["difficulty_index"],
         width=bar_width,
         label='Difficulty Index',
+        yerr=errors.get("difficulty"),
+        capsize=3,
     )
     bars2 = ax.bar(
         x + bar_width / 2,
@@ -83,60 +136,56 @@ def difficulty_discrimination(df):
         width=bar_width,
         label='Discrimination Index',
         color='orange',
+        yerr=errors.get("discrimination"),
+        capsize=3,
     )
 
     ax.set_xlabel('Question')
     ax.set_ylabel('Index Value')
-    ax.set_title('Difficulty and Discrimination Indices per Question')
+    ax.set_title(
+        'Difficulty and Discrimination Indices per Question'
+        + (' (95% bootstrap intervals)' if intervals is not None else '')
+    )
     ax.set_xticks(x)
     ax.set_xticklabels(analysis_results["question"], rotation=45)
-    ax.set_ylim(0, 1.1)
+    lowest = 0.0
+    if errors:
+        # Discrimination intervals can dip below zero.
+        lower_bound = float(np.min(analysis_results["discrimination_index"] - errors["discrimination"][0]))
+        lowest = min(0.0, lower_bound - 0.05) if lower_bound < 0 else 0.0
+    ax.set_ylim(lowest, 1.1)
     ax.legend()
 
-    for bars in [bars1, bars2]:
-        for bar in bars:
+    for bars, name in [(bars1, "difficulty"), (bars2, "discrimination")]:
+        for i, bar in enumerate(bars):
             height = bar.get_height()
+            # Labels sit above the error bar when there is one.
+            top = height + errors[name][1][i] if name in errors else height
             ax.annotate(
                 f'{height:.2f}',
-                xy=(bar.get_x() + bar.get_width() / 2, height),
+                xy=(bar.get_x() + bar.get_width() / 2, top),
                 xytext=(0, 3),
                 textcoords="offset points",
                 ha='center',
                 va='bottom',
             )
 
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig, cache_key, "difficulty_discrimination", intervals is not None)
 
-def top_n_error_types(df, question, n=10):
+@traced("chart:top_n_error_types")
+def top_n_error_types(df, question, n=10, index=None, cache_key=None):
     if "question" not in df.columns or "error_summary" not in df.columns:
         st.warning("Dataset must include 'question' and 'error_summary' columns.")
         return
-
-    df_filtered = df[df["question"] == question]
-    if df_filtered.empty:
-        st.info("No responses available for the selected question.")
+    if _show_cached(cache_key, "top_n_error_types", question, n):
         return
 
-    errors = df_filtered["error_summary"].dropna().str.lower().str.split(", ").explode()
-    if errors.empty:
+    top_df = analytics.top_error_types(df, question, n, index)
+    if top_df.empty or top_df["Frequency"].sum() == 0:
         st.info("No error summaries available to visualize.")
         return
 
-    counts = Counter(errors)
-    summary_df = (
-        pd.DataFrame(counts.items(), columns=["Error Type", "Frequency"])
-        .sort_values(by="Frequency", ascending=False)
-        .reset_index(drop=True)
-    )
-
-    total = summary_df["Frequency"].sum()
-    if total == 0:
-        st.info("No error occurrences found for the selected question.")
-        return
-
-    summary_df["Percentage"] = (summary_df["Frequency"] / total * 100).round(2)
-    top_df = summary_df.head(n)
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(figsize=(10, 6))
     ax.barh(top_df["Error Type"], top_df["Percentage"], color="#1f77b4")
@@ -145,45 +194,73 @@ def top_n_error_types(df, question, n=10):
     ax.set_ylabel("Error Type")
     ax.set_title(f"Top {len(top_df)} Error Types for {question}")
     fig.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig, cache_key, "top_n_error_types", question, n)
 
-def pie_chart_nea(df, question):
+@traced("chart:pie_chart_nea")
+def pie_chart_nea(df, question, index=None, cache_key=None):
     if "question" not in df.columns or "error_category" not in df.columns:
         st.warning("Dataset must include 'question' and 'error_category' columns.")
         return
-
-    q_error_cat = df[df["question"] == question]["error_category"].dropna()
-    error_cat_types = q_error_cat.str.lower().str.split(", ").explode()
-    if error_cat_types.empty:
-        st.info("No NEA error categories available for the selected question.")
+    if _show_cached(cache_key, "pie_chart_nea", question):
         return
 
-    error_cat_counts = Counter(error_cat_types)
-
-    error_cat_df = (
-        pd.DataFrame(error_cat_counts.items(), columns=["Error Category", "Frequency"])
-        .sort_values(by="Frequency", ascending=False)
-        .reset_index(drop=True)
-    )
-    total_cat_errors = error_cat_df["Frequency"].sum()
-    if total_cat_errors == 0:
+    breakdown = analytics.nea_breakdown(df, question, index)
+    if breakdown.empty:
         st.info("No NEA error categories available for the selected question.")
         return
 
-    error_cat_df["Percentage"] = (error_cat_df["Frequency"] / total_cat_errors * 100).round(2)
-
-    top_cat_df = error_cat_df.head(4)
-    others_pct = round(100 - top_cat_df["Percentage"].sum(), 2)
-
-    labels = top_cat_df["Error Category"].tolist() + (["Others"] if others_pct > 0 else [])
-    sizes = top_cat_df["Percentage"].tolist() + ([others_pct] if others_pct > 0 else [])
+    labels = breakdown["Error Category"].tolist()
+    sizes = breakdown["Percentage"].tolist()
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#9467bd', '#8c564b'][:len(labels)]
 
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
     ax.pie(sizes, labels=labels, autopct='%1.1f%%', colors=colors)
     ax.axis('equal')
     ax.set_title(f'Distribution of NEA Categories for {question}')
     fig.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig, cache_key, "pie_chart_nea", question)
+
+@traced("chart:error_heatmap")
+def error_heatmap(df, column, index=None, top=None, sort_by="question", stats=None, cache_key=None):
+    """Questions x labels heatmap of ``column`` shares; every question is drawn from one crosstab."""
+    if "question" not in df.columns or column not in df.columns:
+        st.warning(f"Dataset must include 'question' and '{column}' columns.")
+        return
+    if _show_cached(cache_key, "error_heatmap", column, top, sort_by):
+        return
+
+    shares = analytics.error_shares(df, column, index, top)
+    if shares.empty:
+        st.info("No error labels available to visualize.")
+        return
+    if sort_by == "difficulty" and stats is None:
+        stats = analytics.item_statistics(df)
+    shares = analytics.order_questions(shares, sort_by, stats)
+
+    import matplotlib.pyplot as plt
+
+    n_questions, n_labels = shares.shape
+    fig, ax = plt.subplots(figsize=(max(8, 0.6 * n_labels + 3), min(max(4, 0.25 * n_questions + 2), 24)))
+    image = ax.imshow(shares.to_numpy(), aspect="auto", cmap="viridis", interpolation="nearest")
+    fig.colorbar(image, ax=ax, label="Share of labels (%)")
+
+    # Label at most ~60 rows; hundreds of questions would overlap.
+    step = max(1, int(np.ceil(n_questions / 60)))
+    ax.set_yticks(np.arange(0, n_questions, step))
+    ax.set_yticklabels([str(q) for q in shares.index[::step]])
+    ax.set_xticks(np.arange(n_labels))
+    ax.set_xticklabels(shares.columns, rotation=45, ha="right")
+    if n_questions <= 30 and n_labels <= 12:
+        values = shares.to_numpy()
+        threshold = values.max() / 2
+        for (i, j), value in np.ndenumerate(values):
+            ax.text(j, i, f"{value:.0f}", ha="center", va="center", fontsize=8,
+                    color="black" if value > threshold else "white")
+    kind = "NEA Category" if column == "error_category" else "Error Type"
+    ax.set_xlabel(kind)
+    ax.set_ylabel("Question")
+    ax.set_title(f"{kind} Shares Across All Questions")
+    fig.tight_layout()
+    _show(fig, cache_key, "error_heatmap", column, top, sort_by)
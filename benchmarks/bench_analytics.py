@@ -0,0 +1,125 @@
+"""Wall-time and peak-memory benchmarks for the analytics core.
+
+Usage::
+
+    python -m benchmarks.bench_analytics --scales 10k,1m,10m --json results.json
+    python -m benchmarks.bench_analytics --baseline results.json --tolerance 1.3
+
+Each analysis runs on synthetic datasets at the requested scales. Timing
+runs are separate from the tracemalloc run used for peak memory, so tracing
+overhead does not skew the wall times. With ``--baseline`` the run exits
+non-zero when any case is slower than ``tolerance`` times the baseline.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import pyarrow as pa
+
+from app import analytics
+from app.error_index import ErrorIndex, explode_labels
+from app.error_labels import canonical_mapping
+from benchmarks.synthetic import generate_dataset
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def _cases(df):
+    summary_index = ErrorIndex.build(df, "error_summary")
+    category_index = ErrorIndex.build(df, "error_category")
+    question = summary_index.questions[0]
+    return {
+        "grade_histogram": lambda: analytics.grade_histogram(df),
+        "item_statistics": lambda: analytics.item_statistics(df),
+        "error_index_build": lambda: ErrorIndex.build(df, "error_summary"),
+        "label_clustering": lambda: canonical_mapping(explode_labels(df, "error_summary")["label"].value_counts()),
+        "top_error_types": lambda: analytics.top_error_types(df, question, 10, summary_index),
+        "nea_breakdown": lambda: analytics.nea_breakdown(df, question, category_index),
+    }
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(fn) -> int:
+    gc.collect()
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak + max(0, pool.bytes_allocated() - arrow_before)
+
+
+def run(scales, repeat: int = 3, memory: bool = True) -> list:
+    results = []
+    for scale in scales:
+        df = generate_dataset(SCALES[scale])
+        for name, fn in _cases(df).items():
+            result = {"scale": scale, "case": name, "seconds": _time(fn, repeat)}
+            if memory:
+                result["peak_bytes"] = _peak_memory(fn)
+            results.append(result)
+            print(
+                f"{scale:>5} {name:<20} {result['seconds'] * 1000:10.1f} ms"
+                + (f" {result['peak_bytes'] / 2**20:10.1f} MB" if memory else ""),
+                flush=True,
+            )
+        del df
+    return results
+
+
+def compare(results, baseline, tolerance: float) -> list:
+    """Return the cases slower than ``tolerance`` times their baseline time."""
+    reference = {(r["scale"], r["case"]): r["seconds"] for r in baseline}
+    return [
+        (r["scale"], r["case"], reference[(r["scale"], r["case"])], r["seconds"])
+        for r in results
+        if (r["scale"], r["case"]) in reference and r["seconds"] > reference[(r["scale"], r["case"])] * tolerance
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analytics core on synthetic data.")
+    parser.add_argument("--scales", default="10k,1m", help=f"comma-separated subset of {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="allowed slowdown factor vs the baseline")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip().lower() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"Unknown scales: {', '.join(unknown)}")
+
+    results = run(scales, args.repeat, memory=not args.no_memory)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for scale, case, before, after in regressions:
+            print(f"REGRESSION {scale} {case}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Cold-start import budget for the Streamlit entrypoint and each page.
+
+Usage::
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 800 --repeat 5 --json startup.json
+
+Pages are the ``st.Page`` files registered in ``streamlit_app.py``. For each
+page a fresh interpreter imports Streamlit (always loaded, so it is the
+baseline, not part of the budget), then runs the entrypoint's module-level
+import statements followed by the page's, timing each statement. A module
+shared by both is charged to the entrypoint. Imports under an ``if`` only
+run on a user action (e.g. the first chatbot question), so they are not
+charged to the page load. The run exits non-zero when any page's median
+import time exceeds the budget.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRYPOINT = "streamlit_app.py"
+DEFAULT_BUDGET_MS = 1000
+
+_RUNNER = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import streamlit
+timings = [["streamlit (baseline)", time.perf_counter() - start]]
+for statement in {statements!r}:
+    start = time.perf_counter()
+    exec(statement, {{}})
+    timings.append([statement, time.perf_counter() - start])
+print(json.dumps(timings))
+"""
+
+
+def module_imports(path: str) -> list:
+    """Source of the import statements that always run when ``path`` runs.
+
+    Function bodies and ``if`` branches are skipped; ``try`` and ``with``
+    blocks at module level are followed.
+    """
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), filename=path)
+
+    statements = []
+
+    def visit(nodes):
+        for node in nodes:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                statements.append(ast.unparse(node))
+            elif isinstance(node, (ast.Try, ast.With)):
+                for field in ("body", "orelse", "finalbody"):
+                    visit(getattr(node, field, []))
+                for handler in getattr(node, "handlers", []):
+                    visit(handler.body)
+
+    visit(tree.body)
+    return statements
+
+
+def registered_pages(entrypoint: str) -> list:
+    """Paths passed to ``st.Page(...)`` in the entrypoint."""
+    with open(entrypoint, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), filename=entrypoint)
+    return [
+        node.args[0].value
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call)
+        and getattr(node.func, "attr", None) == "Page"
+        and node.args
+        and isinstance(node.args[0], ast.Constant)
+    ]
+
+
+def measure(statements: list) -> list:
+    """Run ``statements`` in a fresh interpreter; returns ``[statement, seconds]`` pairs."""
+    output = subprocess.run(
+        [sys.executable, "-c", _RUNNER.format(root=ROOT, statements=statements)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int = 3) -> list:
+    entry_statements = module_imports(os.path.join(ROOT, ENTRYPOINT))
+    results = []
+    for page in registered_pages(os.path.join(ROOT, ENTRYPOINT)):
+        page_statements = module_imports(os.path.join(ROOT, page))
+        runs = [measure(entry_statements + page_statements) for _ in range(repeat)]
+        # Median per statement across fresh interpreters.
+        per_statement = [
+            (runs[0][i][0], statistics.median(r[i][1] for r in runs)) for i in range(len(runs[0]))
+        ]
+        baseline = per_statement[0][1]
+        entry = per_statement[1:1 + len(entry_statements)]
+        own = per_statement[1 + len(entry_statements):]
+        results.append({
+            "page": page,
+            "baseline_s": baseline,
+            "entrypoint_s": sum(s for _, s in entry),
+            "page_s": sum(s for _, s in own),
+            "statements": [{"import": stmt, "seconds": s} for stmt, s in entry + own],
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-page import time of the Streamlit app.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="allowed entrypoint + page import time per page, excluding Streamlit itself")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per page (median is kept)")
+    parser.add_argument("--top", type=int, default=3, help="slowest import statements to list per page")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    over_budget = []
+    for result in results:
+        total_ms = (result["entrypoint_s"] + result["page_s"]) * 1000
+        print(
+            f"{result['page']:<22} {total_ms:8.0f} ms  (entrypoint {result['entrypoint_s'] * 1000:.0f} ms, "
+            f"page {result['page_s'] * 1000:.0f} ms, streamlit baseline {result['baseline_s'] * 1000:.0f} ms)"
+        )
+        for item in sorted(result["statements"], key=lambda s: -s["seconds"])[:args.top]:
+            print(f"    {item['seconds'] * 1000:8.1f} ms  {item['import']}")
+        if total_ms > args.budget_ms:
+            over_budget.append((result["page"], total_ms))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    for page, total_ms in over_budget:
+        print(f"OVER BUDGET {page}: {total_ms:.0f} ms > {args.budget_ms:.0f} ms", file=sys.stderr)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""Concurrent-session load test for the Streamlit app.
+
+Usage::
+
+    python -m benchmarks.load_test --sessions 8 --actions 20
+    python -m benchmarks.load_test --sessions 32 --rows 1m --llm-latency-ms 1500 --json load.json
+
+A Streamlit server is started in a subprocess with ``ask_llm``,
+``stream_llm``, the map-reduce and history-summary calls and
+``forms.contact.save_message_to_mongo`` replaced by local fakes that only
+sleep for the configured latency. With ``--rows`` it serves a synthetic
+dataset through DATASET_PATH. Each simulated teacher is a headless
+websocket client speaking Streamlit's own protocol. It loads the app,
+then runs a random mix of dashboard toggles, selectboxes and sliders,
+chatbot questions and contact-form submissions. Every rerun is timed from
+the request to the server's ``script_finished`` message.
+
+The report gives p50/p95/p99 rerun latency per action, throughput, and the
+server's resident memory per connected session. ``AppTest`` is not used
+because it swaps process-global runtime state on every run, so its
+sessions cannot run concurrently. With ``--max-p95-ms`` the run exits
+non-zero when the overall p95 exceeds the budget.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from app.data_store import DEFAULT_DATASET_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRYPOINT = "streamlit_app.py"
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SYNTHETIC_ROWS = "10k"
+
+FAKE_ANSWER = (
+    "Most errors on this question are `sign error` and `decimal point error` (Process Skills). "
+    "Review signed-number rules with worked examples before the next assessment."
+)
+QUESTIONS = [
+    "How did student {student} do on Q{question}?",
+    "What are the most common misconceptions on Q{question}?",
+    "Which NEA category dominates question {question}?",
+    "Is Q{question} too difficult for this cohort?",
+]
+# (action, weight): what a teacher does between page loads.
+ACTIONS = [
+    ("dashboard:toggle", 30),
+    ("dashboard:select", 15),
+    ("dashboard:slider", 10),
+    ("chatbot:ask", 35),
+    ("about:contact", 10),
+]
+DASHBOARD_TOGGLES = [
+    "📊 Toggle Grade Distribution",
+    "📉 Toggle Difficulty & Discrimination Indices",
+    "🗺️ Toggle All-Questions Heatmaps",
+    "🔍 Toggle Top N Error Types",
+    "🥧 Toggle NEA Error Category Pie Chart",
+]
+
+
+# --- Server side ---
+def install_fakes(llm_latency_s: float, mongo_latency_s: float):
+    """Replace the LLM and Mongo entry points with sleeps of the given latency."""
+    import forms.contact as contact
+    import scripts.llm_chat as llm_chat
+    import scripts.map_reduce as map_reduce
+
+    def ask_llm(question, context="", chat_history="", *args, trace=None, **kwargs):
+        time.sleep(llm_latency_s)
+        return FAKE_ANSWER
+
+    def stream_llm(question, context="", chat_history="", metrics=None, *args, **kwargs):
+        words = FAKE_ANSWER.split(" ")
+        for word in words:
+            time.sleep(llm_latency_s / len(words))
+            yield word + " "
+
+    def answer_whole_dataset(dataset, query, chat_history="", *args, on_progress=None, **kwargs):
+        for done in range(1, 5):
+            time.sleep(llm_latency_s / 4)
+            if on_progress:
+                on_progress("map", done, 4)
+        return FAKE_ANSWER
+
+    def summarize_history(prompt, llm=None):
+        time.sleep(llm_latency_s / 4)
+        return "Earlier the teacher asked about several questions and students."
+
+    def save_message_to_mongo(name, email, message):
+        time.sleep(mongo_latency_s)
+
+    llm_chat.ask_llm = ask_llm
+    llm_chat.stream_llm = stream_llm
+    llm_chat.summarize_history = summarize_history
+    map_reduce.answer_whole_dataset = answer_whole_dataset
+    contact.save_message_to_mongo = save_message_to_mongo
+
+
+def serve(port: int, llm_latency_s: float, mongo_latency_s: float):
+    """Run the app on ``port`` with the fakes installed (the ``--serve`` mode of this module)."""
+    from streamlit.web import cli
+
+    sys.path.insert(0, ROOT)
+    install_fakes(llm_latency_s, mongo_latency_s)
+    sys.argv = [
+        "streamlit", "run", ENTRYPOINT,
+        "--server.headless=true",
+        f"--server.port={port}",
+        "--server.fileWatcherType=none",
+        "--browser.gatherUsageStats=false",
+    ]
+    cli.main()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, args, env: dict, log_path: str) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.load_test", "--serve",
+        "--port", str(port),
+        "--llm-latency-ms", str(args.llm_latency_ms),
+        "--mongo-latency-ms", str(args.mongo_latency_ms),
+    ]
+    # Logged to a file: an unread pipe would block the server once it fills.
+    with open(log_path, "wb") as log:
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            with open(log_path, encoding="utf-8", errors="replace") as log:
+                raise RuntimeError(f"Server exited early:\n{log.read()}")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not become healthy within 60 s.")
+
+
+def resident_bytes(pid: int):
+    """Resident set size of ``pid`` from /proc, or None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+# --- Client side ---
+class Session:
+    """One browser tab: a websocket plus the widget values the frontend would send back."""
+
+    def __init__(self, url: str, timeout_s: float):
+        self.url = url
+        self.timeout_s = timeout_s
+        self.ws = None
+        self.pages = {}
+        self.page_hash = ""
+        self.widgets = {}
+        self.values = {}
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.ws = await websocket_connect(self.url, subprotocols=["streamlit"], max_message_size=1 << 30)
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    def widget(self, kind: str, label: str):
+        return self.widgets.get((kind, label))
+
+    def set_value(self, kind: str, label: str, field: str, value) -> bool:
+        element = self.widget(kind, label)
+        if element is None:
+            return False
+        self.values[element.id] = (field, value)
+        return True
+
+    async def rerun(self, page: str = None, triggers=()) -> tuple:
+        """Rerun the current (or named) page clicking ``triggers`` (button labels); returns (seconds, errors)."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        client = message.rerun_script
+        if page is not None and self.pages.get(page, self.page_hash) != self.page_hash:
+            self.page_hash = self.pages[page]
+            self.values = {}
+        client.page_script_hash = self.page_hash
+        for widget_id, (field, value) in self.values.items():
+            state = client.widget_states.widgets.add()
+            state.id = widget_id
+            if field == "double_array_value":
+                state.double_array_value.data.extend(value)
+            else:
+                setattr(state, field, value)
+        for label in triggers:
+            element = self.widget("button", label)
+            if element is not None:
+                state = client.widget_states.widgets.add()
+                state.id = element.id
+                state.trigger_value = True
+
+        start = time.perf_counter()
+        await self.ws.write_message(message.SerializeToString(), binary=True)
+        widgets, errors = {}, 0
+        while True:
+            raw = await asyncio.wait_for(self.ws.read_message(), self.timeout_s)
+            if raw is None:
+                raise ConnectionError("The server closed the websocket.")
+            forward = ForwardMsg()
+            forward.ParseFromString(raw)
+            kind = forward.WhichOneof("type")
+            if kind == "navigation":
+                self.pages = {page.page_name: page.page_script_hash for page in forward.navigation.app_pages}
+                self.page_hash = self.page_hash or forward.navigation.page_script_hash
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element_type = forward.delta.new_element.WhichOneof("type")
+                element = getattr(forward.delta.new_element, element_type)
+                if element_type == "exception":
+                    errors += 1
+                elif getattr(element, "id", "") and hasattr(element, "label"):
+                    widgets[(element_type, element.label)] = element
+            elif kind == "script_finished":
+                break
+        self.widgets = widgets
+        return time.perf_counter() - start, errors
+
+
+async def teacher(index: int, url: str, args, results: list, connected: list):
+    """Run one simulated teacher; every rerun is appended to ``results`` as (action, seconds, errors)."""
+    rng = random.Random(args.seed + index)
+    await asyncio.sleep(index * args.ramp_s / max(args.sessions, 1))
+    session = Session(url, args.timeout_s)
+    await session.connect()
+    connected.append(session)
+
+    async def timed(action, page=None, triggers=()):
+        seconds, errors = await session.rerun(page, triggers)
+        results.append((action, seconds, errors))
+
+    await timed("load")
+    actions, weights = zip(*ACTIONS)
+    for _ in range(args.actions):
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+        action = rng.choices(actions, weights)[0]
+        page = {"dashboard": "Dashboard", "chatbot": "Chat Bot", "about": "About Me"}[action.split(":")[0]]
+        if session.page_hash != session.pages.get(page):
+            await timed(f"{action.split(':')[0]}:load", page)
+
+        if action == "dashboard:toggle":
+            await timed(action, triggers=[rng.choice(DASHBOARD_TOGGLES)])
+        elif action == "dashboard:select":
+            select = session.widget("selectbox", "Select a question")
+            if select is not None and select.options:
+                session.set_value("selectbox", "Select a question", "string_value", rng.choice(select.options))
+            await timed(action)
+        elif action == "dashboard:slider":
+            session.set_value("slider", "Top N Error Types", "double_array_value", [float(rng.randint(3, 20))])
+            await timed(action)
+        elif action == "chatbot:ask":
+            mode = session.widget("radio", "Answer mode")
+            if mode is not None and mode.options:
+                session.set_value("radio", "Answer mode", "int_value", rng.randrange(len(mode.options)))
+            question = rng.choice(QUESTIONS).format(student=rng.randint(1000, 1300), question=rng.randint(1, 10))
+            session.set_value("text_input", "Type your question:", "string_value", question)
+            await timed("chatbot:type")
+            await timed(action, triggers=["Ask"])
+        elif action == "about:contact":
+            opener = "✉️ Contact Me and Share Your Comments"
+            await timed(action, triggers=[opener])
+            session.set_value("text_input", "First Name", "string_value", f"Teacher {index}")
+            session.set_value("text_input", "Email Address", "string_value", f"teacher{index}@example.org")
+            session.set_value("text_area", "Your Message or Comments", "string_value", "Load test message.")
+            await timed(action, triggers=[opener, "Submit"])
+
+
+def percentiles(seconds) -> dict:
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": values.max()}
+
+
+async def drive(url: str, args, server_pid: int) -> dict:
+    # One warm-up session loads the dataset and fills the shared caches,
+    # so the memory baseline excludes state every session shares.
+    warmup = Session(url, args.timeout_s)
+    await warmup.connect()
+    await warmup.rerun()
+    for page in ("Dashboard", "Chat Bot"):
+        await warmup.rerun(page)
+    baseline_rss = resident_bytes(server_pid)
+
+    results, connected = [], []
+    peak_rss = baseline_rss
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while True:
+            rss = resident_bytes(server_pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.ensure_future(sample_memory())
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            teacher(i, url, args, results, connected) for i in range(args.sessions)
+        ))
+        elapsed = time.perf_counter() - start
+        # Measured while every session is still connected.
+        loaded_rss = resident_bytes(server_pid)
+    finally:
+        sampler.cancel()
+        for session in connected + [warmup]:
+            session.close()
+
+    by_action = {}
+    for action, seconds, _ in results:
+        by_action.setdefault(action, []).append(seconds)
+    report = {
+        "sessions": args.sessions,
+        "reruns": len(results),
+        "errors": sum(errors for _, _, errors in results),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "overall": percentiles([seconds for _, seconds, _ in results]),
+        "actions": {action: percentiles(values) for action, values in sorted(by_action.items())},
+        "baseline_rss_bytes": baseline_rss,
+        "loaded_rss_bytes": loaded_rss,
+        "peak_rss_bytes": peak_rss,
+    }
+    if baseline_rss is not None and loaded_rss is not None:
+        report["rss_per_session_bytes"] = (loaded_rss - baseline_rss) / args.sessions
+    return report
+
+
+def print_report(report: dict):
+    print(
+        f"{report['sessions']} sessions · {report['reruns']} reruns in {report['elapsed_s']:.1f}s · "
+        f"{report['throughput_rps']:.1f} reruns/s · {report['errors']} script errors"
+    )
+    print(f"{'action':<20} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for action, stats in [*report["actions"].items(), ("all", report["overall"])]:
+        print(
+            f"{action:<20} {stats['n']:>5} {stats['p50_ms']:9.0f} {stats['p95_ms']:9.0f} "
+            f"{stats['p99_ms']:9.0f} {stats['max_ms']:9.0f}"
+        )
+    if report.get("rss_per_session_bytes") is not None:
+        print(
+            f"server RSS {report['baseline_rss_bytes'] / 2**20:.0f} MB after warm-up, "
+            f"{report['loaded_rss_bytes'] / 2**20:.0f} MB with all sessions, peak {report['peak_rss_bytes'] / 2**20:.0f} MB "
+            f"· {report['rss_per_session_bytes'] / 2**20:.1f} MB per session"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated teachers")
+    parser.add_argument("--actions", type=int, default=20, help="actions per session after the first page load")
+    parser.add_argument("--rows", help=f"serve a synthetic dataset of this size ({', '.join(SCALES)} or a row "
+                                       f"count); defaults to the app's dataset, or {DEFAULT_SYNTHETIC_ROWS} without one")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="latency of each fake LLM call")
+    parser.add_argument("--mongo-latency-ms", type=float, default=50, help="latency of each fake Mongo save")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between actions (0 for none)")
+    parser.add_argument("--ramp-s", type=float, default=2.0, help="spread session starts over this many seconds")
+    parser.add_argument("--timeout-s", type=float, default=120, help="give up on a rerun after this long")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0, help="server port (default: a free one)")
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero when the overall p95 exceeds this")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.port, args.llm_latency_ms / 1000, args.mongo_latency_ms / 1000)
+        return 0
+
+    env = dict(os.environ)
+    dataset_path = os.path.join(ROOT, env.get("DATASET_PATH", DEFAULT_DATASET_PATH))
+    if args.rows is None and not os.path.exists(dataset_path):
+        print(f"{dataset_path} not found; serving a synthetic {DEFAULT_SYNTHETIC_ROWS} dataset.")
+        args.rows = DEFAULT_SYNTHETIC_ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.rows:
+            from benchmarks.synthetic import generate_dataset
+
+            rows = SCALES.get(args.rows.lower()) or int(args.rows)
+            path = os.path.join(tmp, f"synthetic_{rows}.csv")
+            generate_dataset(rows).to_csv(path, index=False)
+            env["DATASET_PATH"] = path
+
+        port = args.port or _free_port()
+        server = start_server(port, args, env, os.path.join(tmp, "server.log"))
+        try:
+            report = asyncio.run(drive(f"ws://localhost:{port}/_stcore/stream", args, server.pid))
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    if args.max_p95_ms is not None and report["overall"]["p95_ms"] > args.max_p95_ms:
+        print(f"p95 rerun latency {report['overall']['p95_ms']:.0f} ms exceeds {args.max_p95_ms:.0f} ms",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
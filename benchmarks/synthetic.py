@@ -0,0 +1,107 @@
+"""Synthetic grading datasets shaped like the app's real exports.
+
+Grades follow a simple item-response model (student ability vs question
+difficulty), error labels follow a Zipf-like long tail that includes
+near-duplicate spellings, and each wrong answer carries one or two NEA
+categories. Columns use the dtypes ``app.ingest.read_csv`` produces.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+NEA_CATEGORIES = [
+    "Reading Error",
+    "Comprehension Error",
+    "Transformation Error",
+    "Process Skills Error",
+    "Encoding Error",
+]
+
+ERROR_LABELS = [
+    "sign error", "sign mistake", "wrong sign", "sign errors",
+    "calculation error", "calculation mistake", "arithmetic error",
+    "misread question", "misreading the question",
+    "decimal point error", "decimal error",
+    "unit mistake", "wrong units",
+    "incorrect formula", "wrong formula",
+    "order of operations", "order of operation error",
+    "fraction simplification", "fraction error",
+    "incomplete answer", "missing steps",
+    "wrong variable", "variable confusion",
+    "rounding error", "notation error",
+    "misapplied theorem", "algebraic manipulation error",
+    "copying error", "transcription error",
+    "exponent rule error", "distribution error",
+    "negative number handling", "inequality direction error",
+]
+
+_RESPONSE_TEMPLATES = [
+    "The student wrote {a} instead of {b}, which suggests a {label}.",
+    "Work shows correct setup but a {label} in step {a}.",
+    "Final answer {a} differs from the expected {b}; the error stems from a {label}.",
+    "The student seems to confuse the quantities, leading to a {label} when computing {a}.",
+]
+
+
+def _zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _arrow_strings(pool, codes) -> pd.array:
+    return pd.arrays.ArrowStringArray(pa.array(pool, pa.string()).take(pa.array(codes)))
+
+
+def _label_combos(rng, labels, n_combos, max_labels):
+    weights = _zipf_weights(len(labels))
+    combos = []
+    for _ in range(n_combos):
+        k = rng.integers(1, max_labels + 1)
+        combos.append(", ".join(rng.choice(labels, size=k, replace=False, p=weights)))
+    return combos
+
+
+def generate_dataset(n_rows: int, n_questions: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_questions = max(1, min(n_questions, n_rows))
+    n_students = int(np.ceil(n_rows / n_questions))
+
+    order = rng.permutation(n_rows)
+    student_codes = order // n_questions
+    question_codes = order % n_questions
+
+    ability = rng.normal(0.0, 1.0, n_students)
+    difficulty = rng.normal(0.0, 1.0, n_questions)
+    p_correct = 1.0 / (1.0 + np.exp(-(ability[student_codes] - difficulty[question_codes])))
+    grades = rng.binomial(2, p_correct) / 2.0
+    wrong = grades < 1.0
+
+    summary_pool = _label_combos(rng, ERROR_LABELS, 2000, 3)
+    category_pool = _label_combos(rng, NEA_CATEGORIES, 50, 2)
+    response_pool = [
+        template.format(a=rng.integers(1, 100), b=rng.integers(1, 100), label=label)
+        for template in _RESPONSE_TEMPLATES
+        for label in ERROR_LABELS
+        for _ in range(4)
+    ]
+
+    summary_codes = rng.choice(len(summary_pool), n_rows, p=_zipf_weights(len(summary_pool), 0.8))
+    category_codes = rng.choice(len(category_pool), n_rows, p=_zipf_weights(len(category_pool), 0.8))
+    response_codes = rng.integers(0, len(response_pool), n_rows)
+
+    questions = pd.Categorical.from_codes(
+        question_codes, categories=sorted(f"Q{i + 1}" for i in range(n_questions))
+    )
+    students = pd.Categorical.from_codes(student_codes, categories=100000 + np.arange(n_students))
+
+    df = pd.DataFrame({
+        "student_id": students,
+        "question": questions,
+        "grade": grades,
+        "error_summary": _arrow_strings(summary_pool, summary_codes),
+        "error_category": _arrow_strings(category_pool, category_codes),
+        "llm_response": _arrow_strings(response_pool, response_codes),
+    })
+    # Fully correct answers carry no error annotations.
+    df.loc[~wrong, ["error_summary", "error_category"]] = pd.NA
+    return df
@@ -1,35 +1,61 @@
+import atexit
 import re
+import sqlite3
 from datetime import datetime
 from typing import Tuple
 
 import streamlit as st
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
 
+from app.settings import get_setting
 
+
+# pymongo is imported on first use so the About page loads without it.
 @st.cache_resource(show_spinner=False)
-def _get_mongo_client(uri: str) -> MongoClient:
+def _get_mongo_client(uri: str):
+    from pymongo import MongoClient
+
     return MongoClient(uri, serverSelectionTimeoutMS=5000)
 
 
 def _get_mongo_settings() -> Tuple[str, str, str]:
     required_keys = ("MONGO_URI", "MONGO_DB", "MONGO_COLLECTION")
-    missing = [key for key in required_keys if key not in st.secrets]
-    if missing:
+    values = tuple(get_setting(key) for key in required_keys)
+    if not all(values):
         raise RuntimeError(
             "MongoDB connection details are not configured. "
             "Please add MONGO_URI, MONGO_DB, and MONGO_COLLECTION to Streamlit secrets."
         )
 
-    return tuple(st.secrets[key] for key in required_keys)
+    return values
+
+
+@st.cache_resource(show_spinner=False)
+def get_message_writer(uri: str, database: str, collection_name: str):
+    """One background writer per target collection, shared by all sessions."""
+    from forms.mongo_writer import (
+        DEFAULT_BATCH_SIZE,
+        DEFAULT_FLUSH_INTERVAL_S,
+        DEFAULT_QUEUE_SIZE,
+        DEFAULT_SPOOL_PATH,
+        BackgroundMongoWriter,
+    )
+
+    writer = BackgroundMongoWriter(
+        lambda: _get_mongo_client(uri)[database][collection_name],
+        spool_path=get_setting("CONTACT_SPOOL_PATH", DEFAULT_SPOOL_PATH),
+        queue_size=int(get_setting("CONTACT_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+        batch_size=int(get_setting("CONTACT_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+        flush_interval_s=float(get_setting("CONTACT_FLUSH_INTERVAL_S", DEFAULT_FLUSH_INTERVAL_S)),
+    )
+    atexit.register(writer.close)
+    return writer
 
 def is_valid_email(email):
     return re.match(r"^[\w\.-]+@[\w\.-]+\.\w+$", email)
 
 def save_message_to_mongo(name, email, message):
-    uri, database, collection_name = _get_mongo_settings()
-    client = _get_mongo_client(uri)
-    collection = client[database][collection_name]
+    """Queue the message for the background writer; returns without waiting on Mongo."""
+    writer = get_message_writer(*_get_mongo_settings())
 
     doc = {
         "name": name,
@@ -38,7 +64,7 @@ def save_message_to_mongo(name, email, message):
         "timestamp": datetime.utcnow()
     }
 
-    collection.insert_one(doc)
+    writer.submit(doc)
 
 def contact_form():
     with st.form("contact_form"):
@@ -66,5 +92,6 @@ def contact_form():
             st.success("🎉 Your message has been submitted successfully!")
         except RuntimeError as exc:
             st.error(str(exc))
-        except PyMongoError as exc:
+        except (OSError, sqlite3.Error) as exc:
+            # Raised by the local spool when the queue is full and it cannot be written.
             st.error(f"Error saving message: {exc}")
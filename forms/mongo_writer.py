@@ -0,0 +1,238 @@
+"""Background, batched MongoDB writer with a local durable spool.
+
+``submit`` only puts the document on a bounded in-memory queue, so callers
+(the contact form) never wait on Mongo. A worker thread drains the queue in
+``insert_many`` batches. Batches that cannot be written (Mongo down, queue
+full, shutdown) go to a SQLite spool and are replayed once Mongo answers
+again. Documents get their ``_id`` on submit, so a replayed batch that was
+partly written before is not duplicated. Documents Mongo rejects outright
+(e.g. schema validation) are moved to a dead-letter table in the spool
+instead of blocking the messages behind them.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from bson import ObjectId, json_util
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_PATH = ".cache/contact_spool.sqlite3"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+MAX_BACKOFF_S = 60.0
+_DUPLICATE_KEY = 11000
+
+
+class MessageSpool:
+    """FIFO of pending documents in SQLite, safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter "
+            "(id INTEGER PRIMARY KEY, doc TEXT NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+        )
+
+    def push(self, docs):
+        rows = [(json_util.dumps(doc),) for doc in docs]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO spool (doc) VALUES (?)", rows)
+
+    def peek(self, limit: int):
+        """Return up to ``limit`` of the oldest ``(row_id, doc)`` pairs without removing them."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, doc FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json_util.loads(doc)) for row_id, doc in rows]
+
+    def remove(self, row_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in row_ids])
+
+    def bury(self, rejected):
+        """Keep ``(doc, error)`` pairs Mongo will never accept in the dead-letter table."""
+        now = time.time()
+        rows = [(json_util.dumps(doc, default=repr), error, now) for doc, error in rejected]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO dead_letter (doc, error, failed_at) VALUES (?, ?, ?)", rows)
+
+    def dead_letters(self, limit: int = 100):
+        """Return up to ``limit`` of the oldest ``(doc, error)`` dead letters."""
+        with self._lock:
+            rows = self._conn.execute("SELECT doc, error FROM dead_letter ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(json_util.loads(doc), error) for doc, error in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+
+class BackgroundMongoWriter:
+    """Write documents to the collection returned by ``collection_factory`` off the caller's thread.
+
+    ``collection_factory`` is called lazily from the worker, so any object
+    with an ``insert_many(docs, ordered=...)`` method can stand in for a
+    real collection.
+    """
+
+    def __init__(self, collection_factory, spool_path: str = DEFAULT_SPOOL_PATH,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S):
+        self._collection_factory = collection_factory
+        self._collection = None
+        self.spool = MessageSpool(spool_path)
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._backoff_s = 0.0
+        self._retry_at = 0.0
+        self.inserted = 0
+        self.failures = 0
+        self.rejected = 0
+
+        self._thread = threading.Thread(target=self._run, name="mongo-writer", daemon=True)
+        self._thread.start()
+
+    # --- Producer side ---
+    def submit(self, doc: dict):
+        """Queue ``doc`` for writing; spools it directly when the queue is full."""
+        doc = dict(doc)
+        doc.setdefault("_id", ObjectId())
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            self.spool.push([doc])
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued document was written or spooled; True unless timed out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Stop the worker; whatever it could not write stays in the spool."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "spooled": len(self.spool),
+            "inserted": self.inserted,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+    # --- Worker side ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._write_batch(batch)
+                if self._available():
+                    self._replay()
+            except Exception:
+                # e.g. a spool error: keep the worker alive and try again shortly.
+                logger.exception("Mongo writer iteration failed")
+                self._stop.wait(self.flush_interval_s)
+        # Shutdown: persist what is still queued rather than losing it.
+        leftover = self._drain()
+        if leftover:
+            self.spool.push(leftover)
+            for _ in leftover:
+                self._queue.task_done()
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        return batch + self._drain(self.batch_size - 1)
+
+    def _drain(self, limit: int = None) -> list:
+        docs = []
+        while limit is None or len(docs) < limit:
+            try:
+                docs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return docs
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def _write_batch(self, batch: list):
+        try:
+            if not (self._available() and self._insert(batch)):
+                self.spool.push(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _replay(self):
+        while True:
+            pending = self.spool.peek(self.batch_size)
+            if not pending:
+                return
+            if not self._insert([doc for _, doc in pending]):
+                return
+            self.spool.remove([row_id for row_id, _ in pending])
+
+    def _insert(self, docs: list) -> bool:
+        """Write ``docs``; on failure start (or extend) the backoff and return False.
+
+        Documents rejected for good are dead-lettered and count as handled.
+        """
+        rejected = []
+        try:
+            if self._collection is None:
+                self._collection = self._collection_factory()
+            try:
+                self._collection.insert_many(docs, ordered=False)
+            except BulkWriteError as exc:
+                if exc.details.get("writeConcernErrors"):
+                    raise
+                # Duplicates were written by an earlier, partly failed attempt;
+                # any other write error is a document Mongo will not take.
+                rejected = [
+                    (docs[err["index"]], err.get("errmsg", f"code {err.get('code')}"))
+                    for err in exc.details.get("writeErrors", [])
+                    if err.get("code") != _DUPLICATE_KEY
+                ]
+            except InvalidDocument as exc:
+                if len(docs) > 1:
+                    # Raised before anything is sent: find the culprit one document at a time.
+                    return all(self._insert([doc]) for doc in docs)
+                rejected = [(docs[0], str(exc))]
+        except (PyMongoError, RuntimeError) as exc:
+            self.failures += 1
+            self._backoff_s = min(MAX_BACKOFF_S, max(1.0, self._backoff_s * 2))
+            self._retry_at = time.monotonic() + self._backoff_s
+            logger.warning("Mongo write failed (%s); retrying in %.0fs", exc, self._backoff_s)
+            return False
+        if rejected:
+            self.spool.bury(rejected)
+            self.rejected += len(rejected)
+            logger.error("Mongo rejected %d document(s), moved to the dead-letter table: %s",
+                         len(rejected), rejected[0][1])
+        self.inserted += len(docs) - len(rejected)
+        self._backoff_s = 0.0
+        return True
@@ -0,0 +1,212 @@
+"""Offline NEA diagnosis for every (student, question) pair in a dataset.
+
+Usage::
+
+    python -m scripts.batch_diagnose data/predicting_students_errors.csv \\
+        --output diagnoses.jsonl --parquet diagnoses.parquet --concurrency 8 --rate 5
+
+Each finished diagnosis is appended to the JSONL output as soon as it
+arrives, and pairs already present there are skipped, so an interrupted
+run picks up where it stopped. ``--fake-model`` swaps in a local fake chat
+model for dry runs and testing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from tqdm import tqdm
+
+from app.ingest import MissingColumnsError, read_csv
+from app.settings import get_setting
+from scripts.dataset_digest import build_digest
+from scripts.llm_chat import chat_prompt, get_llm
+from scripts.llm_client import get_client_manager
+
+DIAGNOSIS_QUESTION = (
+    "Diagnose the errors of student {student_id} on question {question}. "
+    "Classify them using Newman's Error Categories and recommend a targeted remediation."
+)
+FAKE_DIAGNOSIS = "`student_answer` vs `correct_answer`: Process Skills Error (fake diagnosis)."
+
+
+class RateLimiter:
+    """Space request starts at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _pair_key(student_id, question) -> str:
+    return json.dumps([str(student_id), str(question)])
+
+
+def load_completed(path: str) -> set:
+    """Return the (student, question) keys already written to ``path``.
+
+    A run killed mid-write can leave a partial last line; it is truncated so
+    that pair is redone and new records start on a fresh line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as fh:
+        valid_end = 0
+        for line in fh:
+            if not line.endswith(b"\n"):
+                break
+            record = json.loads(line)
+            done.add(_pair_key(record["student_id"], record["question"]))
+            valid_end += len(line)
+        fh.truncate(valid_end)
+    return done
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+async def diagnose_all(df: pd.DataFrame, llm, output: str, concurrency: int = 8, rate: float = 0.0,
+                       progress: bool = True) -> dict:
+    """Diagnose every pending (student, question) group, appending results to ``output``."""
+    done = load_completed(output)
+    groups = [
+        (student_id, question, rows)
+        for (student_id, question), rows in df.groupby(["student_id", "question"], sort=False, observed=True)
+        if _pair_key(student_id, question) not in done
+    ]
+
+    digest = build_digest(df)
+    manager = get_client_manager()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    summary = {"skipped": len(done), "completed": 0, "failed": 0}
+    bar = tqdm(total=len(groups), disable=not progress, unit="pair")
+
+    async def diagnose(student_id, question, rows, out):
+        inputs = {
+            "digest": digest,
+            "context": rows.to_csv(index=False),
+            "chat_history": "",
+            "question": DIAGNOSIS_QUESTION.format(student_id=student_id, question=question),
+        }
+        async with semaphore:
+            await limiter.wait()
+            try:
+                response = await manager.acall(llm, lambda: chain.ainvoke(inputs))
+            except Exception as e:
+                summary["failed"] += 1
+                tqdm.write(f"⚠️ {student_id}/{question}: {e}", file=sys.stderr)
+                return
+            finally:
+                bar.update(1)
+
+        record = {
+            "student_id": _to_python(student_id),
+            "question": _to_python(question),
+            "diagnosis": response.content.strip(),
+        }
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        summary["completed"] += 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    async with manager.async_llm(llm) as async_llm:
+        chain = chat_prompt | async_llm
+        with open(output, "a", encoding="utf-8") as out:
+            try:
+                await asyncio.gather(*(diagnose(s, q, rows, out) for s, q, rows in groups))
+            finally:
+                bar.close()
+                os.fsync(out.fileno())
+    return summary
+
+
+def export_parquet(jsonl_path: str, parquet_path: str):
+    records = pd.read_json(jsonl_path, lines=True, dtype=False)
+    records.to_parquet(parquet_path, index=False)
+
+
+class FakeDiagnosisModel(BaseChatModel):
+    """Answers every prompt with a canned diagnosis after ``latency`` seconds.
+
+    The async path awaits the latency instead of sleeping in an executor
+    thread, so ``--fake-latency`` measures the pipeline's concurrency rather
+    than the size of the default thread pool.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-diagnosis"
+
+    @staticmethod
+    def _result() -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=FAKE_DIAGNOSIS))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch NEA diagnosis for every (student, question) pair.")
+    parser.add_argument("dataset", help="CSV file with student_id and question columns")
+    parser.add_argument("--output", default="diagnoses.jsonl", help="JSONL output, also used as the checkpoint")
+    parser.add_argument("--parquet", help="also write the final results to this Parquet file")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="maximum requests started per second (0 = unlimited)")
+    parser.add_argument("--model", default=None, help="OpenAI model (defaults to OPENAI_MODEL or gpt-4o)")
+    parser.add_argument("--fake-model", action="store_true", help="use a local fake chat model instead of OpenAI")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="seconds the fake model waits per call")
+    args = parser.parse_args(argv)
+
+    if args.fake_model:
+        llm = FakeDiagnosisModel(latency=args.fake_latency)
+    else:
+        llm, err = get_llm(api_key=get_setting("OPENAI_API_KEY"), model_name=args.model)
+        if err:
+            parser.error(f"{err} Set OPENAI_API_KEY or use --fake-model.")
+
+    try:
+        df, _ = read_csv(args.dataset, required=("student_id", "question"))
+    except MissingColumnsError as e:
+        parser.error(str(e))
+
+    try:
+        summary = asyncio.run(diagnose_all(df, llm, args.output, args.concurrency, args.rate))
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun the same command to resume from {args.output}.", file=sys.stderr)
+        return 130
+
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
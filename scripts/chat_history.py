@@ -0,0 +1,112 @@
+"""Token-budgeted chat history for long chatbot sessions.
+
+The most recent turns are sent verbatim. Older turns are folded into a
+rolling summary, which is updated incrementally: a fold sends only the
+previous summary and the turns being folded, so each fold is one cheap
+call however long the session is. Folds happen in batches, once the
+verbatim turns outgrow their share of the budget, and the rendered
+history never exceeds the budget. Per-turn token counts are computed
+once, so rendering costs the same on turn 5 and turn 500.
+"""
+import logging
+
+from scripts.tokens import count_tokens, truncate_tokens
+
+DEFAULT_HISTORY_BUDGET = 2000
+SUMMARY_SHARE = 0.25
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a teacher and an educational data assistant. "
+    "Update the summary with the new turns below. Keep the students, questions, figures and conclusions "
+    "discussed and any open requests; drop pleasantries and repetition. Reply with the updated summary only, "
+    "in at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"User: {question}\nBot: {answer}"
+
+
+class ChatHistory:
+    """Renders (question, answer) turns as prompt history within ``budget`` tokens.
+
+    The turns themselves are owned by the caller (the chatbot keeps them in
+    session state for display); this object only tracks the summary, how
+    many leading turns it covers and the cached token count of each turn.
+    """
+
+    def __init__(self, budget: int = DEFAULT_HISTORY_BUDGET, model: str = ""):
+        self.budget = budget
+        self.model = model
+        self.summary_budget = int(budget * SUMMARY_SHARE)
+        self.recent_budget = budget - self.summary_budget
+        self.summary = ""
+        self.folded = 0
+        self._tokens = []
+
+    def _turn_tokens(self, turns) -> list:
+        for question, answer in turns[len(self._tokens):]:
+            self._tokens.append(count_tokens(format_turn(question, answer), self.model) + 1)
+        return self._tokens
+
+    def render(self, turns) -> str:
+        """The summary plus as many recent turns as fit, never more than ``budget`` tokens."""
+        tokens = self._turn_tokens(turns)
+        parts = []
+        remaining = self.budget
+        if self.summary:
+            summary = "Summary of the earlier conversation:\n" + truncate_tokens(
+                self.summary, self.summary_budget, self.model
+            )
+            parts.append(summary)
+            remaining -= count_tokens(summary, self.model) + 1
+
+        recent = []
+        for i in range(len(turns) - 1, self.folded - 1, -1):
+            if tokens[i] > remaining:
+                if not recent:
+                    # Even the latest turn alone is too long: keep its start.
+                    recent.append(truncate_tokens(format_turn(*turns[i]), remaining, self.model))
+                break
+            recent.append(format_turn(*turns[i]))
+            remaining -= tokens[i]
+        return "\n".join(parts + recent[::-1])
+
+    def needs_fold(self, turns) -> bool:
+        return sum(self._turn_tokens(turns)[self.folded:]) > self.recent_budget
+
+    def fold(self, turns, summarize) -> bool:
+        """Fold the oldest verbatim turns into the summary when they outgrow their share.
+
+        Turns are folded until the rest fit in half of ``recent_budget``, so
+        the next fold is several turns away. ``summarize(prompt)`` returns
+        the new summary text; when it fails the turns stay verbatim (and
+        ``render`` drops the oldest ones) until the next attempt.
+        """
+        if not self.needs_fold(turns):
+            return False
+        tokens = self._turn_tokens(turns)
+        keep_from, kept = len(turns), 0
+        while keep_from > self.folded and kept + tokens[keep_from - 1] <= self.recent_budget // 2:
+            keep_from -= 1
+            kept += tokens[keep_from]
+
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_budget * 0.7),
+            summary=self.summary or "(none yet)",
+            turns="\n".join(
+                truncate_tokens(format_turn(*turn), self.recent_budget, self.model)
+                for turn in turns[self.folded:keep_from]
+            ),
+        )
+        try:
+            summary = summarize(prompt)
+        except Exception as e:
+            logger.warning("Chat history summary failed: %s", e)
+            return False
+        self.summary = truncate_tokens(summary.strip(), self.summary_budget, self.model)
+        self.folded = keep_from
+        return True
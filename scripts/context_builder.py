@@ -0,0 +1,185 @@
+"""Entity-aware LLM context selection.
+
+Student IDs and question names mentioned in a chat question are resolved
+through hash indexes on ``student_id`` and ``question``; the matching rows
+are packed into a fixed token budget instead of always sending the first
+rows of the dataset.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from scripts.tokens import count_tokens, count_tokens_batch
+
+DEFAULT_TOKEN_BUDGET = 6000
+_RECORD_SEP = "\x1e"
+_CHUNK_ROWS = 256
+
+_TOKEN_RE = re.compile(r"[\w\-]+(?:\.[\w\-]+)*")
+_QUESTION_NUMBER_RE = re.compile(r"\b(?:question|q)\s*[#_\-]?\s*(\d+)\b")
+_TRAILING_NUMBER_RE = re.compile(r"(\d+)\s*$")
+# Tokens right after these words (or a "#") are read as student IDs even when unknown.
+_ID_POSITION_RE = re.compile(r"(?:\b(?:students?|id)\s*[#:]?\s*|#\s*)([\w\-]+(?:\.[\w\-]+)*)")
+
+
+def _normalize(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().lower()
+
+
+def _id_shape(token: str):
+    """Digit/letter pattern plus leading half of ``token``: IDs of one dataset share both."""
+    pattern = "".join("9" if ch.isdigit() else "a" if ch.isalpha() else ch for ch in token)
+    return pattern, token[:len(token) // 2]
+
+
+def _build_index(series: pd.Series, labels: dict) -> dict:
+    index = {}
+    for value, positions in series.groupby(series, sort=False, observed=True).indices.items():
+        key = _normalize(value)
+        index[key] = np.concatenate([index[key], positions]) if key in index else positions
+        labels.setdefault(key, str(value))
+    return index
+
+
+class ContextIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.labels = {}
+        self.students = _build_index(df["student_id"], self.labels) if "student_id" in df.columns else {}
+        self.questions = _build_index(df["question"], self.labels) if "question" in df.columns else {}
+
+        names = sorted(self.questions, key=len, reverse=True)
+        self._question_re = (
+            re.compile(r"(?<![\w])(?:" + "|".join(map(re.escape, names)) + r")(?![\w])")
+            if names else None
+        )
+        numbered = {}
+        for name in self.questions:
+            match = _TRAILING_NUMBER_RE.search(name)
+            if match:
+                numbered.setdefault(int(match.group(1)), []).append(name)
+        self._question_numbers = {n: names[0] for n, names in numbered.items() if len(names) == 1}
+
+        self._id_shapes = {_id_shape(key) for key in self.students}
+
+    def extract_entities(self, query: str):
+        """Return (student keys, question keys, unknown IDs) mentioned in ``query``."""
+        text = query.lower()
+        questions = []
+        consumed = set()
+        if self._question_re is not None:
+            questions.extend(m.group(0) for m in self._question_re.finditer(text))
+        for match in _QUESTION_NUMBER_RE.finditer(text):
+            name = self._question_numbers.get(int(match.group(1)))
+            consumed.add(match.group(1))
+            if name is not None:
+                questions.append(name)
+
+        # A number is only reported as an unknown student ID when it follows
+        # "student"/"id"/"#" or looks like the dataset's IDs, so years and
+        # scores in the question are left alone.
+        id_positions = {m.group(1) for m in _ID_POSITION_RE.finditer(text)}
+        students, unknown = [], []
+        for token in _TOKEN_RE.findall(text):
+            if token in self.students:
+                students.append(token)
+            elif (
+                token not in consumed
+                and token not in self.questions
+                and any(ch.isdigit() for ch in token)
+                and (token in id_positions or _id_shape(token) in self._id_shapes)
+            ):
+                unknown.append(token)
+
+        return list(dict.fromkeys(students)), list(dict.fromkeys(questions)), list(dict.fromkeys(unknown))
+
+    def resolve_question(self, text: str):
+        """Index key of the question named ``text`` ("Q3", "question 3", ...), or None."""
+        key = _normalize(text)
+        if key in self.questions:
+            return key
+        match = _QUESTION_NUMBER_RE.search(key) or _TRAILING_NUMBER_RE.search(key)
+        return self._question_numbers.get(int(match.group(1))) if match else None
+
+    def resolve_student(self, text: str):
+        """Index key of the student ``text``, or None."""
+        key = _normalize(text)
+        return key if key in self.students else None
+
+    def lookup(self, students, questions) -> np.ndarray:
+        """Row positions for the given entities; both kinds given means their overlap."""
+        student_rows = [self.students[s] for s in students if s in self.students]
+        question_rows = [self.questions[q] for q in questions if q in self.questions]
+        by_student = np.unique(np.concatenate(student_rows)) if student_rows else None
+        by_question = np.unique(np.concatenate(question_rows)) if question_rows else None
+
+        if by_student is not None and by_question is not None:
+            both = np.intersect1d(by_student, by_question, assume_unique=True)
+            return both if len(both) else np.union1d(by_student, by_question)
+        if by_student is not None:
+            return by_student
+        if by_question is not None:
+            return by_question
+        return np.empty(0, dtype=np.int64)
+
+
+def pack_rows(df: pd.DataFrame, positions, budget: int, model: str = ""):
+    """Serialize rows as CSV until ``budget`` tokens are used; returns (text, rows packed)."""
+    header = ",".join(map(str, df.columns))
+    used = count_tokens(header, model)
+    lines = [header]
+    for start in range(0, len(positions), _CHUNK_ROWS):
+        chunk = df.iloc[positions[start:start + _CHUNK_ROWS]]
+        records = chunk.to_csv(index=False, header=False, lineterminator=_RECORD_SEP).split(_RECORD_SEP)[:-1]
+        for record, tokens in zip(records, count_tokens_batch(records, model)):
+            # One more for the newline that joins it to the previous line.
+            if used + tokens + 1 > budget:
+                return "\n".join(lines), len(lines) - 1
+            used += tokens + 1
+            lines.append(record)
+    return "\n".join(lines), len(lines) - 1
+
+
+def build_context(index: ContextIndex, query: str, budget: int = DEFAULT_TOKEN_BUDGET,
+                  model: str = "", retriever=None, top_k: int = 50) -> str:
+    """Build the LLM context for ``query`` within ``budget`` tokens.
+
+    Rows about the mentioned students/questions are used when any are found,
+    ordered by relevance when a ``retriever`` (see ``scripts.retrieval``) is
+    given; otherwise the retriever's top-k rows, or the leading rows, are used.
+    """
+    students, questions, unknown = index.extract_entities(query)
+    positions = index.lookup(students, questions)
+
+    notes = []
+    if len(positions):
+        if retriever is not None:
+            positions = retriever.rank(query, positions)
+        described = []
+        if students:
+            described.append("student_id " + ", ".join(index.labels[s] for s in students))
+        if questions:
+            described.append("question " + ", ".join(index.labels[q] for q in questions))
+        notes.append(f"Rows matching {' and '.join(described)}.")
+    else:
+        positions = retriever.search(query, top_k) if retriever is not None else positions
+        if len(positions):
+            notes.append("No specific student or question was identified; showing the rows most relevant to the question.")
+        else:
+            positions = np.arange(len(index.df))
+            notes.append("No specific student or question was identified; showing a sample of rows.")
+    if unknown:
+        notes.append(f"Student IDs not found in the dataset: {', '.join(unknown)}.")
+
+    note_text = "\n".join(notes)
+    table, packed = pack_rows(index.df, positions, budget - count_tokens(note_text, model), model)
+    if packed < len(positions):
+        note_text += f"\nShowing {packed} of {len(positions)} rows (token budget reached)."
+    return f"{note_text}\n\n{table}"
+
+
+def context_index_for(dataset) -> ContextIndex:
+    return dataset.derive("context_index", ContextIndex)
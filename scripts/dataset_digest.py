@@ -0,0 +1,82 @@
+"""Compact whole-dataset digest placed at the start of every prompt.
+
+The digest (schema, row counts, per-question difficulty and top error
+type, overall error types and NEA category shares) depends only on the
+dataset's content, so it is built once per dataset hash. Placed right
+after the static system prompt, it turns the start of every request into
+an identical prefix that provider-side prompt caching can reuse.
+"""
+import numpy as np
+
+from app.error_index import ErrorIndex, error_index_for
+from app.item_analysis import item_statistics
+from app.settings import get_setting
+from scripts.tokens import count_tokens, count_tokens_batch
+
+DIGEST_TOKEN_BUDGET = 400
+TOP_LABELS = 5
+LABEL_CHARS = 40
+
+
+def _short(label) -> str:
+    label = str(label)
+    return label if len(label) <= LABEL_CHARS else label[:LABEL_CHARS - 1] + "…"
+
+
+def _overall_shares(index: ErrorIndex, top: int = TOP_LABELS) -> str:
+    """The ``top`` labels of ``index`` across all questions with their share of all labels."""
+    totals = np.bincount(index.codes, weights=index.counts, minlength=len(index.categories))
+    if totals.sum() == 0:
+        return ""
+    order = np.lexsort((np.arange(len(totals)), -totals))[:top]
+    return ", ".join(f"{_short(index.categories[i])} {totals[i] / totals.sum():.0%}" for i in order)
+
+
+def build_digest(df, name: str = "", errors: ErrorIndex = None, categories: ErrorIndex = None,
+                 budget: int = DIGEST_TOKEN_BUDGET, model: str = "") -> str:
+    """Describe ``df`` in at most ``budget`` tokens; per-question lines are dropped from the end to fit."""
+    if errors is None and "error_summary" in df.columns:
+        errors = ErrorIndex.build(df, "error_summary")
+    if categories is None and "error_category" in df.columns:
+        categories = ErrorIndex.build(df, "error_category")
+
+    summary = f"Dataset: {name or 'dataset'}, {len(df):,} rows"
+    if "student_id" in df.columns:
+        summary += f", {df['student_id'].nunique():,} students"
+    if "question" in df.columns:
+        summary += f", {df['question'].nunique():,} questions"
+    lines = [summary + ".", "Columns: " + ", ".join(f"{col} ({dtype})" for col, dtype in df.dtypes.items())]
+    if categories is not None:
+        lines.append("NEA category shares: " + _overall_shares(categories))
+    if errors is not None:
+        lines.append("Most frequent error types: " + _overall_shares(errors))
+
+    question_lines = []
+    if {"question", "student_id", "grade"} <= set(df.columns):
+        lines.append("Per question: difficulty index, discrimination index, top error type (share).")
+        for row in item_statistics(df).itertuples(index=False):
+            line = f"{row.question}: {row.difficulty_index:.2f}, {row.discrimination_index:.2f}"
+            freqs = errors.frequencies(row.question) if errors is not None else None
+            if freqs is not None and len(freqs):
+                line += f", {_short(freqs['Label'].iloc[0])} ({freqs['Percentage'].iloc[0]:.0f}%)"
+            question_lines.append(line)
+
+    used = count_tokens("\n".join(lines), model)
+    for i, tokens in enumerate(count_tokens_batch(question_lines, model)):
+        if used + tokens > budget:
+            lines.append(f"({len(question_lines) - i} more questions omitted)")
+            break
+        used += tokens
+        lines.append(question_lines[i])
+    return "\n".join(lines)
+
+
+def digest_for(dataset) -> str:
+    """The dataset's digest, built once per dataset content hash."""
+    return dataset.derive("digest", lambda df: build_digest(
+        df,
+        dataset.name,
+        error_index_for(dataset, "error_summary"),
+        error_index_for(dataset, "error_category"),
+        model=get_setting("OPENAI_MODEL", "gpt-4o"),
+    ))
@@ -1,61 +1,220 @@
+import time
+
 import streamlit as st
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 
+from app.instrumentation import record_span, span
+from app.settings import get_setting
+from scripts.llm_client import get_client_manager, log_usage, token_usage
+from scripts.llm_tools import TOOL_INSTRUCTIONS, run_tool_loop, stream_tool_loop
+from scripts.response_cache import get_response_cache, make_key
+
 # --- Safe key + LLM fetch ---
-def get_llm():
-    user_key = st.session_state.get("OPENAI_API_KEY")
+def get_llm(api_key: str = None, model_name: str = None):
+    user_key = api_key or st.session_state.get("OPENAI_API_KEY")
     if not user_key:
         return None, "⚠️ No API key provided."
     
     # define model_name inside the function so it's always available
-    model_name = st.secrets.get("OPENAI_MODEL", "gpt-4o")
-    llm = ChatOpenAI(model=model_name, temperature=0.2, api_key=user_key)
+    model_name = model_name or get_setting("OPENAI_MODEL", "gpt-4o")
+    llm = get_client_manager().get_llm(user_key, model_name, temperature=0.2)
     return llm, None
 
 # --- Prompt Template ---
 
-chat_prompt = ChatPromptTemplate.from_messages([
-    ("system", 
-     "You are an expert educational assistant specializing in diagnosing student learning patterns, misconceptions, and performance gaps. "
-     "You analyze LLM responses, error summaries, and error categories to identify the root causes of misunderstanding.\n\n"
-     "Your objectives are to:\n"
-     "1. Interpret and explain student errors and misconceptions.\n"
-     "2. Recommend targeted learning resources or remedial strategies.\n"
-     "3. Provide clear, evidence-based, and pedagogically sound explanations.\n"
-     "4. Tailor your feedback based on each student's question, grade, and response history.\n\n"
-
-     "Always begin your response by explicitly recalling both the student's response and the correct answer before giving any explanation, diagnosis, or categorization. "
-     "Always format the student's response and the correct answer using inline code syntax with backticks, like: `student_answer` and `correct_answer`. "
-     "This ensures they are highlighted in a distinct color block for readability.\n\n"
-
-     "If the user request involves categorizing student mistakes according to Newman’s Error Categories, use the `error_category` column from the dataset when available, and follow the definitions below:\n\n"
-     "Newman’s Error Categories:\n"
-     "1. Reading Error: Misreading or misinterpreting a mathematical problem's text or symbols.\n"
-     "2. Comprehension Error: Correct reading but failure to grasp the meaning.\n"
-     "3. Transformation Error: Understanding the problem but failing to convert it into a mathematical representation.\n"
-     "4. Process Skills Error: Correct transformation but incorrect calculations, methods, or algorithms.\n"
-     "5. Encoding Error: Correct solution reached but expressed incorrectly (notation, decimal placement, miswriting).\n\n"
-
-     "Always respond in a supportive, constructive tone. Assume the user is seeking actionable insights to support student learning and improvement.\n\n"
-     "Note: If the student ID is not present in the data provided, assume the student answered correctly and no errors were detected. You can say it."
-    ),
-    ("human", "Context:\n{context}\n\nChat History:\n{chat_history}\n\nQuestion: {question}")
+# Bump whenever chat_prompt changes so cached answers from the old prompt are not reused.
+PROMPT_VERSION = "2"
+
+SYSTEM_PROMPT = (
+    "You are an expert educational assistant specializing in diagnosing student learning patterns, misconceptions, and performance gaps. "
+    "You analyze LLM responses, error summaries, and error categories to identify the root causes of misunderstanding.\n\n"
+    "Your objectives are to:\n"
+    "1. Interpret and explain student errors and misconceptions.\n"
+    "2. Recommend targeted learning resources or remedial strategies.\n"
+    "3. Provide clear, evidence-based, and pedagogically sound explanations.\n"
+    "4. Tailor your feedback based on each student's question, grade, and response history.\n\n"
+
+    "Always begin your response by explicitly recalling both the student's response and the correct answer before giving any explanation, diagnosis, or categorization. "
+    "Always format the student's response and the correct answer using inline code syntax with backticks, like: `student_answer` and `correct_answer`. "
+    "This ensures they are highlighted in a distinct color block for readability.\n\n"
+
+    "If the user request involves categorizing student mistakes according to Newman’s Error Categories, use the `error_category` column from the dataset when available, and follow the definitions below:\n\n"
+    "Newman’s Error Categories:\n"
+    "1. Reading Error: Misreading or misinterpreting a mathematical problem's text or symbols.\n"
+    "2. Comprehension Error: Correct reading but failure to grasp the meaning.\n"
+    "3. Transformation Error: Understanding the problem but failing to convert it into a mathematical representation.\n"
+    "4. Process Skills Error: Correct transformation but incorrect calculations, methods, or algorithms.\n"
+    "5. Encoding Error: Correct solution reached but expressed incorrectly (notation, decimal placement, miswriting).\n\n"
+
+    "Always respond in a supportive, constructive tone. Assume the user is seeking actionable insights to support student learning and improvement.\n\n"
+    "Note: The dataset overview summarizes the whole dataset. The context lists the dataset rows that match the students and questions named in the request. "
+    "If the context reports that a student ID was not found in the dataset, say so instead of guessing about that student."
+)
+# Most stable first: the system prompt and the per-dataset digest form a prefix
+# shared by every request on a dataset, which provider-side prompt caching reuses.
+HUMAN_PROMPT = (
+    "Dataset overview:\n{digest}\n\nContext:\n{context}\n\nChat History:\n{chat_history}\n\nQuestion: {question}"
+)
+
+chat_prompt = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("human", HUMAN_PROMPT)])
+# Used when the model answers through the analytics tools (scripts.llm_tools).
+tool_prompt = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT + "\n\n" + TOOL_INSTRUCTIONS),
+    ("human", HUMAN_PROMPT),
 ])
 
 
+# --- Response cache ---
+def _model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+
+def _cache_key(llm, question: str, context: str, chat_history: str, digest: str = "", tools=None,
+               dataset_key: str = "") -> str:
+    version = PROMPT_VERSION
+    if tools:
+        version += "+tools:" + ",".join(tool.name for tool in tools)
+    # The digest is lossy and tool answers never reach ``context``, so the
+    # dataset's content hash is what tells two datasets apart.
+    return make_key(_model_name(llm), getattr(llm, "temperature", None), version, question, context, chat_history,
+                    digest, dataset_key)
+
+
 # --- LLM Interaction Function ---
-def ask_llm(question: str, context: str = "", chat_history: str = "") -> str:
-    llm, err = get_llm()
-    if err:
-        return err
-    try:
+def ask_llm(question: str, context: str = "", chat_history: str = "", llm=None, use_cache: bool = True,
+            tools=None, trace: list = None, digest: str = "", dataset_key: str = "") -> str:
+    """Answer ``question`` in one call, or through a tool-calling loop when ``tools`` are given.
+
+    ``digest`` is the dataset overview from ``scripts.dataset_digest`` and
+    ``dataset_key`` the dataset's content hash, which keeps cached answers
+    apart across datasets. With tools (see ``scripts.llm_tools``) the model
+    fetches exact aggregates itself, so ``context`` can stay empty.
+    ``trace`` (if given) receives one entry per tool call.
+    """
+    if llm is None:
+        llm, err = get_llm()
+        if err:
+            return err
+    with span("llm.invoke", model=_model_name(llm), cache_hit=False, tools=bool(tools)) as record:
+        cache = get_response_cache() if use_cache else None
+        key = _cache_key(llm, question, context, chat_history, digest, tools, dataset_key) if cache else None
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                record["cache_hit"] = True
+                return cached
+        inputs = {"digest": digest, "context": context, "chat_history": chat_history, "question": question}
+        manager = get_client_manager()
+        try:
+            if tools:
+                messages = tool_prompt.format_messages(**inputs)
+                calls = [] if trace is None else trace
+                response = run_tool_loop(
+                    llm, messages, tools, lambda model, msgs: manager.call(llm, lambda: model.invoke(msgs)), trace=calls
+                )
+                record["tool_calls"] = len(calls)
+                usage = {}
+                # The loop appends every response, the final one included, to ``messages``.
+                for message in messages:
+                    for name, value in token_usage(message).items():
+                        usage[name] = usage.get(name, 0) + value
+            else:
+                chain = chat_prompt | llm
+                response = manager.call(llm, lambda: chain.invoke(inputs))
+                usage = token_usage(response)
+            record.update(usage)
+            log_usage(_model_name(llm), usage)
+            answer = response.content.strip()
+        except Exception as e:
+            record["error"] = type(e).__name__
+            return f"⚠️ Failed to fetch response from LLM: {e}"
+    if cache:
+        cache.set(key, answer)
+    return answer
+
+
+def stream_llm(question: str, context: str = "", chat_history: str = "", metrics: dict = None,
+               llm=None, use_cache: bool = True, digest: str = "", dataset_key: str = "",
+               tools=None, trace: list = None):
+    """Yield the answer in chunks as the model produces them.
+
+    ``metrics`` (if given) receives ``ttft_s`` (time to first token),
+    ``total_s``, ``chunks``, ``cache_hit`` and token usage, including
+    prompt-cached tokens (when the model reports it), once the stream is
+    exhausted. With ``tools`` the model answers through the same tool loop
+    as ``ask_llm``; usage then covers every round and ``ttft_s`` counts from
+    the question to the first token of the answer.
+    """
+    metrics = {} if metrics is None else metrics
+    if llm is None:
+        llm, err = get_llm()
+        if err:
+            yield err
+            return
+
+    start = time.perf_counter()
+    metrics["chunks"] = 0
+    metrics["cache_hit"] = False
+    cache = get_response_cache() if use_cache else None
+    key = _cache_key(llm, question, context, chat_history, digest, tools, dataset_key) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.update(cache_hit=True, chunks=1, ttft_s=time.perf_counter() - start)
+            metrics["total_s"] = metrics["ttft_s"]
+            record_span("llm.stream", metrics["total_s"] * 1000, model=_model_name(llm), cache_hit=True)
+            yield cached
+            return
+
+    parts = []
+    inputs = {"digest": digest, "context": context, "chat_history": chat_history, "question": question}
+    manager = get_client_manager()
+    if tools:
+        calls = [] if trace is None else trace
+        chunks = stream_tool_loop(
+            llm, tool_prompt.format_messages(**inputs), tools,
+            lambda model, msgs: manager.stream(llm, lambda: model.stream(msgs)), trace=calls,
+        )
+    else:
         chain = chat_prompt | llm
-        response = chain.invoke({
-            "question": question,
-            "context": context,
-            "chat_history": chat_history
-        })
-        return response.content.strip()
+        chunks = manager.stream(llm, lambda: chain.stream(inputs))
+    try:
+        for chunk in chunks:
+            # Usage arrives per response, so tool rounds add up.
+            for name, value in token_usage(chunk).items():
+                metrics[name] = metrics.get(name, 0) + value
+            text = chunk.content if isinstance(chunk.content, str) else ""
+            if not text:
+                continue
+            if metrics["chunks"] == 0:
+                metrics["ttft_s"] = time.perf_counter() - start
+            metrics["chunks"] += 1
+            parts.append(text)
+            yield text
     except Exception as e:
-        return f"⚠️ Failed to fetch response from LLM: {e}"
\ No newline at end of file
+        metrics["error"] = type(e).__name__
+        yield f"⚠️ Failed to fetch response from LLM: {e}"
+        return
+    finally:
+        metrics["total_s"] = time.perf_counter() - start
+        if tools:
+            metrics["tool_calls"] = len(calls)
+        record_span("llm.stream", metrics["total_s"] * 1000, model=_model_name(llm),
+                    **{k: v for k, v in metrics.items() if k != "total_s"})
+        log_usage(_model_name(llm), metrics)
+    if cache and parts:
+        cache.set(key, "".join(parts).strip())
+
+
+def summarize_history(prompt: str, llm=None) -> str:
+    """Run one history-summary prompt (see ``scripts.chat_history``) on the cheap summary model."""
+    if llm is None:
+        llm, err = get_llm(model_name=get_setting("HISTORY_SUMMARY_MODEL", "gpt-4o-mini"))
+        if err:
+            raise RuntimeError(err)
+    with span("llm.summarize_history", model=_model_name(llm)) as record:
+        response = get_client_manager().call(llm, lambda: llm.invoke(prompt))
+        usage = token_usage(response)
+        record.update(usage)
+        log_usage(_model_name(llm), usage)
+    return response.content
@@ -0,0 +1,198 @@
+"""Pooled, retrying OpenAI chat clients.
+
+One ``ChatOpenAI`` is kept per (API key hash, model, temperature), all of
+them sharing a single ``httpx`` connection pool. Calls go through a
+per-key concurrency limiter and a jittered exponential backoff for rate
+limits, timeouts and 5xx responses.
+
+Async connections belong to the event loop that opened them, so async
+callers (one ``asyncio.run`` per request) get a copy of the model bound to
+a pool of their own through ``async_llm``.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import asynccontextmanager, nullcontext
+
+import httpx
+import openai
+import streamlit as st
+from langchain_openai import ChatOpenAI
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_S = 60
+DEFAULT_CONNECT_TIMEOUT_S = 10
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_MAX_WAIT_S = 30
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_CONNECTIONS = 32
+LIMITER_POLL_S = 0.05
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def key_hash(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def token_usage(message) -> dict:
+    """Input, output, total and prompt-cached token counts a model response reports."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    counts = {k: usage[k] for k in ("input_tokens", "output_tokens", "total_tokens") if k in usage}
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached is not None:
+        counts["cached_tokens"] = cached
+    return counts
+
+
+def log_usage(model: str, usage: dict):
+    if "input_tokens" in usage:
+        logger.info(
+            "LLM usage model=%s input_tokens=%s cached_tokens=%s total_tokens=%s",
+            model, usage["input_tokens"], usage.get("cached_tokens", 0), usage.get("total_tokens"),
+        )
+
+
+class LLMClientManager:
+    def __init__(self, timeout_s=DEFAULT_TIMEOUT_S, connect_timeout_s=DEFAULT_CONNECT_TIMEOUT_S,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, max_wait_s=DEFAULT_MAX_WAIT_S,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 base_url=None):
+        self.timeout = httpx.Timeout(timeout_s, connect=connect_timeout_s)
+        self.max_attempts = max_attempts
+        self.max_wait_s = max_wait_s
+        self.max_concurrency = max_concurrency
+        self.base_url = base_url
+
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+
+        self._clients = {}
+        self._client_keys = {}
+        self._client_args = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get_llm(self, api_key: str, model: str, temperature: float = 0.2) -> ChatOpenAI:
+        hashed = key_hash(api_key)
+        cache_key = (hashed, model, temperature)
+        with self._lock:
+            llm = self._clients.get(cache_key)
+            if llm is None:
+                args = dict(model=model, temperature=temperature, api_key=api_key)
+                llm = self._chat_model(**args)
+                self._clients[cache_key] = llm
+                self._client_keys[id(llm)] = hashed
+                self._client_args[id(llm)] = args
+            return llm
+
+    def _chat_model(self, http_async_client=None, **args) -> ChatOpenAI:
+        return ChatOpenAI(
+            **args,
+            base_url=self.base_url,
+            # Report token usage on streamed responses too.
+            stream_usage=True,
+            timeout=self.timeout,
+            # Retries are handled here so they respect the concurrency limiter.
+            max_retries=0,
+            http_client=self.http_client,
+            http_async_client=http_async_client,
+        )
+
+    @asynccontextmanager
+    async def async_llm(self, llm):
+        """Yield ``llm`` bound to an async connection pool owned by the running event loop.
+
+        A pool shared across ``asyncio.run`` calls keeps connections tied to
+        loops that have closed, which fails or hangs the next loop that picks
+        one up. Foreign models (e.g. local fakes) are yielded unchanged.
+        """
+        args = self._client_args.get(id(llm))
+        if args is None:
+            yield llm
+            return
+        async with httpx.AsyncClient(limits=self.limits, timeout=self.timeout) as http_async_client:
+            yield self._chat_model(http_async_client=http_async_client, **args)
+
+    def _semaphore(self, llm):
+        hashed = self._client_keys.get(id(llm))
+        if hashed is None:
+            return None
+        with self._lock:
+            return self._limiters.setdefault(hashed, threading.BoundedSemaphore(self.max_concurrency))
+
+    def limiter(self, llm):
+        """Return the concurrency limiter of the key behind ``llm`` (a no-op for foreign models)."""
+        return self._semaphore(llm) or nullcontext()
+
+    def _retry_args(self) -> dict:
+        return dict(
+            retry=retry_if_exception(_is_retryable),
+            wait=wait_random_exponential(multiplier=0.5, max=self.max_wait_s),
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        )
+
+    def call(self, llm, fn):
+        """Run ``fn()`` under the key's limiter, retrying transient API failures."""
+        with self.limiter(llm):
+            for attempt in Retrying(**self._retry_args()):
+                with attempt:
+                    return fn()
+
+    async def acall(self, llm, fn):
+        """Await ``fn()`` under the limiter of the key behind ``llm`` with the same retry policy.
+
+        ``llm`` is the pooled model from ``get_llm`` (not its ``async_llm``
+        copy). The limiter is a thread semaphore shared with the sync calls of
+        every session, so it is polled without blocking rather than waited on:
+        a blocked loop (or executor thread) would stall the calls that free it.
+        """
+        semaphore = self._semaphore(llm)
+        if semaphore is not None:
+            while not semaphore.acquire(blocking=False):
+                await asyncio.sleep(LIMITER_POLL_S)
+        try:
+            async for attempt in AsyncRetrying(**self._retry_args()):
+                with attempt:
+                    return await fn()
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def stream(self, llm, open_stream):
+        """Yield from ``open_stream()``, retrying only until the first chunk arrives."""
+        with self.limiter(llm):
+            for attempt in Retrying(**self._retry_args()):
+                with attempt:
+                    iterator = iter(open_stream())
+                    first = next(iterator, None)
+            if first is None:
+                return
+            yield first
+            yield from iterator
+
+
+@st.cache_resource(show_spinner=False)
+def get_client_manager() -> LLMClientManager:
+    return LLMClientManager(
+        timeout_s=float(get_setting("OPENAI_TIMEOUT_S", DEFAULT_TIMEOUT_S)),
+        max_attempts=int(get_setting("OPENAI_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+        max_concurrency=int(get_setting("OPENAI_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+        base_url=get_setting("OPENAI_BASE_URL"),
+    )
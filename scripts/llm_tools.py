@@ -0,0 +1,156 @@
+"""Local analytics exposed to the chat model as tools.
+
+Instead of reading raw rows, the model calls these tools and gets back
+exact aggregates computed by ``app.analytics``: item statistics, Top-N
+error types, NEA category shares and one student's history. Results are
+compact JSON, so prompts stay a fraction of the row-dump size.
+"""
+import json
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import StructuredTool
+
+from app import analytics
+from app.error_index import error_index_for
+from scripts.context_builder import context_index_for
+
+DEFAULT_MAX_TOOL_ROUNDS = 4
+HISTORY_COLUMNS = ["question", "grade", "error_summary", "error_category", "llm_response"]
+RESPONSE_PREVIEW_CHARS = 300
+
+TOOL_INSTRUCTIONS = (
+    "The dataset overview below summarizes the dataset; the context does not list rows. You can call tools that compute exact statistics from the dataset. Use them for any difficulty, "
+    "discrimination, error frequency, NEA category or per-student figure instead of estimating, "
+    "and quote the numbers they return."
+)
+
+
+def _records(frame, decimals: int = 3) -> str:
+    return frame.round(decimals).to_json(orient="records")
+
+
+def analytics_tools(dataset) -> list:
+    """Tools bound to ``dataset``; each returns JSON text or a short error message."""
+    index = context_index_for(dataset)
+
+    def question_label(question: str):
+        key = index.resolve_question(question)
+        if key is None:
+            known = ", ".join(sorted(index.labels[q] for q in index.questions))
+            raise ValueError(f"Unknown question {question!r}. Known questions: {known}")
+        return index.labels[key]
+
+    def question_statistics(question: str = "") -> str:
+        """Difficulty index, discrimination index, point-biserial correlation and response count
+        for one question, or for every question when ``question`` is empty."""
+        stats = dataset.derive("item_statistics", analytics.item_statistics)
+        if question:
+            stats = stats[stats["question"].astype(str) == question_label(question)]
+        return _records(stats)
+
+    def top_error_types(question: str, n: int = 10) -> str:
+        """The ``n`` most frequent error types of a question with their counts and percentages."""
+        question = question_label(question)
+        return _records(analytics.top_error_types(dataset.df, question, n, error_index_for(dataset, "error_summary")))
+
+    def nea_breakdown(question: str) -> str:
+        """Percentage of each Newman (NEA) error category for a question; minor categories are grouped as Others."""
+        question = question_label(question)
+        return _records(analytics.nea_breakdown(dataset.df, question, error_index_for(dataset, "error_category")))
+
+    def student_history(student_id: str) -> str:
+        """Every graded response of one student: question, grade, error summary, error category and
+        the start of the diagnostic response."""
+        key = index.resolve_student(student_id)
+        if key is None:
+            return json.dumps({"error": f"Student {student_id!r} was not found in the dataset."})
+        rows = dataset.df.iloc[index.students[key]]
+        rows = rows[[col for col in HISTORY_COLUMNS if col in rows.columns]]
+        if "llm_response" in rows.columns:
+            rows = rows.assign(llm_response=rows["llm_response"].str.slice(0, RESPONSE_PREVIEW_CHARS))
+        summary = {"student_id": index.labels[key], "responses": len(rows)}
+        if "grade" in rows.columns:
+            summary["mean_grade"] = round(float(analytics.grade_values(rows).mean()), 3)
+        return json.dumps({**summary, "history": json.loads(_records(rows))})
+
+    return [
+        StructuredTool.from_function(fn)
+        for fn in (question_statistics, top_error_types, nea_breakdown, student_history)
+    ]
+
+
+def analytics_tools_for(dataset) -> list:
+    return dataset.derive("llm_tools", lambda df: analytics_tools(dataset))
+
+
+def _bind(llm, tools: list):
+    """``(model, final_model)``: ``llm`` with ``tools`` bound, and with tool calls disabled."""
+    try:
+        return llm.bind_tools(tools), llm.bind_tools(tools, tool_choice="none")
+    except NotImplementedError:
+        return llm, llm
+
+
+def _call_tools(response, by_name: dict, messages: list, trace: list = None):
+    """Run the tool calls of ``response``, appending one ``ToolMessage`` per call to ``messages``."""
+    for call in response.tool_calls:
+        tool = by_name.get(call["name"])
+        try:
+            if tool is None:
+                raise ValueError(f"Unknown tool {call['name']!r}.")
+            content = tool.invoke(call["args"])
+        except Exception as exc:
+            content = json.dumps({"error": str(exc)})
+        if trace is not None:
+            trace.append({"tool": call["name"], "args": call["args"], "result_chars": len(content)})
+        messages.append(ToolMessage(content=content, tool_call_id=call["id"], name=call["name"]))
+
+
+def run_tool_loop(llm, messages: list, tools: list, invoke, max_rounds: int = DEFAULT_MAX_TOOL_ROUNDS,
+                  trace: list = None):
+    """Let the model call ``tools`` until it answers; returns the final AI message.
+
+    Every model response, the final one included, is appended to ``messages``.
+
+    ``invoke(model, messages)`` performs one model call (so callers can add
+    retries). Models without native tool binding, such as scripted fakes,
+    are used as they are. ``trace`` (if given) receives one dict per call.
+    """
+    by_name = {tool.name: tool for tool in tools}
+    model, final_model = _bind(llm, tools)
+
+    for _ in range(max_rounds):
+        response = invoke(model, messages)
+        messages.append(response)
+        if not getattr(response, "tool_calls", None):
+            return response
+        _call_tools(response, by_name, messages, trace)
+
+    # Out of rounds: ask for an answer from what has been gathered so far.
+    response = invoke(final_model, messages)
+    messages.append(response)
+    return response
+
+
+def stream_tool_loop(llm, messages: list, tools: list, open_stream, max_rounds: int = DEFAULT_MAX_TOOL_ROUNDS,
+                     trace: list = None):
+    """``run_tool_loop`` that yields the chunks of every model response as they arrive.
+
+    ``open_stream(model, messages)`` returns one response's chunks. The
+    answer is streamed as the model writes it; the rounds that only call
+    tools carry no text.
+    """
+    by_name = {tool.name: tool for tool in tools}
+    model, final_model = _bind(llm, tools)
+
+    for round_ in range(max_rounds + 1):
+        response = None
+        for chunk in open_stream(model if round_ < max_rounds else final_model, messages):
+            response = chunk if response is None else response + chunk
+            yield chunk
+        if response is None:
+            return
+        messages.append(response)
+        if not getattr(response, "tool_calls", None) or round_ == max_rounds:
+            return
+        _call_tools(response, by_name, messages, trace)
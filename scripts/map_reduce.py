@@ -0,0 +1,181 @@
+"""Map-reduce answering over the whole dataset.
+
+The dataset is cut into token-budgeted chunks, one or more per question
+(or plain row ranges). Each chunk is summarized against the user's request
+with ``chat_prompt`` (the map step, run concurrently under a cap). The
+partial answers are then combined into one response (the reduce step, in
+several rounds if the partials do not fit one prompt). Final answers are
+cached per dataset hash, request and chat history.
+"""
+import asyncio
+
+import numpy as np
+
+from app.instrumentation import span
+from app.settings import get_setting
+from scripts.context_builder import DEFAULT_TOKEN_BUDGET, pack_rows
+from scripts.dataset_digest import digest_for
+from scripts.llm_chat import PROMPT_VERSION, chat_prompt, get_llm
+from scripts.llm_client import get_client_manager, log_usage, token_usage
+from scripts.response_cache import get_response_cache, make_key
+from scripts.tokens import count_tokens
+
+DEFAULT_CONCURRENCY = 4
+PARTITIONS = ("question", "chunk")
+
+MAP_INSTRUCTION = (
+    "You are reading one part of a larger dataset ({label}). Using only the rows in the context, "
+    "write a concise summary of the evidence relevant to the request below (counts, recurring errors and "
+    "misconceptions, notable students) so it can be combined with summaries of the other parts.\n\n"
+    "Request: {query}"
+)
+REDUCE_INSTRUCTION = (
+    "The context holds partial answers, each computed on one part of the dataset. Combine them into a "
+    "single answer covering the whole dataset: add up counts the parts report, keep the strongest "
+    "evidence and do not mention the partitioning.\n\nRequest: {query}"
+)
+
+
+def partition(df, by: str = "question", budget: int = DEFAULT_TOKEN_BUDGET, model: str = "") -> list:
+    """Split ``df`` into ``(label, csv text)`` chunks of at most ``budget`` tokens each."""
+    if by == "question" and "question" in df.columns:
+        groups = [
+            (f"question {question}", positions)
+            for question, positions in df.groupby("question", sort=True, observed=True).indices.items()
+        ]
+    else:
+        groups = [("rows", np.arange(len(df)))]
+
+    chunks = []
+    for label, positions in groups:
+        offset = 0
+        while offset < len(positions):
+            text, packed = pack_rows(df, positions[offset:], budget, model)
+            if packed == 0:
+                # A single row larger than the budget: skip it rather than loop forever.
+                offset += 1
+                continue
+            if by == "question":
+                chunks.append((label, text))
+            else:
+                chunks.append((f"rows {offset + 1}-{offset + packed}", text))
+            offset += packed
+    return chunks
+
+
+def _pack_partials(partials: list, budget: int, model: str) -> list:
+    """Group ``(label, answer)`` partials into context blocks of at most ``budget`` tokens."""
+    blocks, current, used = [], [], 0
+    for label, answer in partials:
+        entry = f"[Partial answer for {label}]\n{answer}"
+        tokens = count_tokens(entry, model)
+        if current and used + tokens > budget:
+            blocks.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(entry)
+        used += tokens
+    if current:
+        blocks.append("\n\n".join(current))
+    return blocks
+
+
+async def map_reduce(llm, chunks: list, query: str, chat_history: str = "", budget: int = DEFAULT_TOKEN_BUDGET,
+                     concurrency: int = DEFAULT_CONCURRENCY, on_progress=None, model: str = "",
+                     digest: str = "", usage: dict = None) -> str:
+    """Answer ``query`` from ``chunks``; ``on_progress(stage, done, total)`` follows every call.
+
+    ``usage`` (if given) accumulates the token counts of all calls.
+    """
+    usage = {} if usage is None else usage
+    manager = get_client_manager()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with manager.async_llm(llm) as async_llm:
+        chain = chat_prompt | async_llm
+
+        async def run_all(stage, jobs):
+            done = 0
+            if on_progress:
+                on_progress(stage, done, len(jobs))
+
+            async def run(inputs):
+                nonlocal done
+                async with semaphore:
+                    response = await manager.acall(llm, lambda: chain.ainvoke(inputs))
+                for name, value in token_usage(response).items():
+                    usage[name] = usage.get(name, 0) + value
+                done += 1
+                if on_progress:
+                    on_progress(stage, done, len(jobs))
+                return response.content.strip()
+
+            return await asyncio.gather(*(run(inputs) for inputs in jobs))
+
+        answers = await run_all("map", [
+            {"digest": digest, "context": text, "chat_history": "",
+             "question": MAP_INSTRUCTION.format(label=label, query=query)}
+            for label, text in chunks
+        ])
+        partials = [(label, answer) for (label, _), answer in zip(chunks, answers)]
+
+        reduce_round = 0
+        while True:
+            blocks = _pack_partials(partials, budget, model)
+            if len(blocks) <= 1 or len(blocks) == len(partials):
+                # Done, or every partial alone exceeds the budget and grouping cannot shrink them.
+                break
+            # Too many partials for one prompt: combine them in groups first.
+            reduce_round += 1
+            answers = await run_all(f"reduce {reduce_round}", [
+                {"digest": digest, "context": block, "chat_history": "",
+                 "question": REDUCE_INSTRUCTION.format(query=query)}
+                for block in blocks
+            ])
+            partials = [(f"group {i + 1}", answer) for i, answer in enumerate(answers)]
+
+        (final,) = await run_all("reduce", [{
+            "digest": digest,
+            "context": "\n\n".join(blocks),
+            "chat_history": chat_history,
+            "question": REDUCE_INSTRUCTION.format(query=query),
+        }])
+    return final
+
+
+def answer_whole_dataset(dataset, query: str, chat_history: str = "", llm=None, by: str = "question",
+                         budget: int = None, concurrency: int = None, on_progress=None,
+                         use_cache: bool = True) -> str:
+    """Run ``map_reduce`` over ``dataset``, returning a cached answer when one exists."""
+    if llm is None:
+        llm, err = get_llm()
+        if err:
+            return err
+    budget = budget or int(get_setting("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    concurrency = concurrency or int(get_setting("MAP_REDUCE_CONCURRENCY", DEFAULT_CONCURRENCY))
+    model = getattr(llm, "model_name", None) or type(llm).__name__
+
+    cache = get_response_cache() if use_cache else None
+    key = make_key(model, getattr(llm, "temperature", None), f"{PROMPT_VERSION}+map_reduce:{by}:{budget}",
+                   query, chat_history=chat_history, dataset_key=dataset.key)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    with span("llm.map_reduce", model=model, partition=by) as record:
+        chunks = partition(dataset.df, by, budget, model)
+        record["chunks"] = len(chunks)
+        usage = {}
+        try:
+            answer = asyncio.run(
+                map_reduce(llm, chunks, query, chat_history, budget, concurrency, on_progress, model,
+                           digest_for(dataset), usage)
+            )
+            record.update(usage)
+            log_usage(model, usage)
+        except Exception as e:
+            record["error"] = type(e).__name__
+            return f"⚠️ Failed to fetch response from LLM: {e}"
+    if cache:
+        cache.set(key, answer)
+    return answer
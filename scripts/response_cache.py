@@ -0,0 +1,103 @@
+"""On-disk cache of LLM answers.
+
+Entries are keyed on everything that determines an answer (model,
+temperature, prompt template version, question, the dataset's content
+hash, and hashes of the context and chat history), expire after a TTL and are evicted least-recently-used
+once the table grows past ``max_entries``.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from app.settings import get_setting
+
+DEFAULT_CACHE_PATH = ".cache/llm_responses.sqlite3"
+DEFAULT_TTL_HOURS = 24 * 7
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(model: str, temperature, prompt_version: str, question: str,
+             context: str = "", chat_history: str = "", digest: str = "", dataset_key: str = "") -> str:
+    payload = json.dumps([
+        model, temperature, prompt_version, question, _digest(context), _digest(chat_history), _digest(digest),
+        dataset_key,
+    ])
+    return _digest(payload)
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Return the process-wide response cache, or None when disabled via LLM_CACHE_ENABLED."""
+    if str(get_setting("LLM_CACHE_ENABLED", "true")).lower() in ("0", "false", "no"):
+        return None
+    return ResponseCache(
+        get_setting("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+        ttl_seconds=float(get_setting("LLM_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600,
+        max_entries=int(get_setting("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    )
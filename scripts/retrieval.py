@@ -0,0 +1,149 @@
+"""Offline BM25 retrieval over the free-text columns of a dataset.
+
+The index is a term-major sparse matrix (CSR layout in plain NumPy arrays)
+built in a few vectorized passes, persisted as ``.npz`` next to the other
+local caches and loaded lazily the first time a dataset is queried. No
+network access or model downloads are involved.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from app.ingest import as_text
+from app.settings import get_setting
+
+TEXT_COLUMNS = ("error_summary", "llm_response")
+DEFAULT_CACHE_DIR = ".cache/bm25"
+DEFAULT_TOP_K = 50
+
+_TOKEN_PATTERN = r"[a-z0-9]+"
+_STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have how i in is it its "
+    "of on or so that the their them they this to was were what when where which who why "
+    "will with you".split()
+)
+
+
+def tokenize(text: str) -> list:
+    tokens = re.findall(_TOKEN_PATTERN, text.lower())
+    return [t for t in tokens if t not in _STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, terms, indptr, doc_ids, term_freqs, doc_lengths, k1=1.5, b=0.75):
+        self.terms = np.asarray(terms, dtype=object)
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self._vocab = {term: i for i, term in enumerate(self.terms)}
+        self._avg_length = float(doc_lengths.mean()) if len(doc_lengths) and doc_lengths.mean() > 0 else 1.0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns=TEXT_COLUMNS, **params) -> "BM25Index":
+        columns = [c for c in columns if c in df.columns]
+        n_docs = len(df)
+        text = as_text(pd.Series("", index=pd.RangeIndex(n_docs)))
+        for column in columns:
+            text = text + " " + as_text(df[column]).fillna("").reset_index(drop=True)
+
+        tokens = text.str.lower().str.findall(_TOKEN_PATTERN).explode().dropna()
+        tokens = tokens[~tokens.isin(_STOPWORDS)]
+        term_codes, terms = pd.factorize(tokens, sort=True)
+        docs = tokens.index.to_numpy(dtype=np.int64)
+
+        pair_codes, counts = np.unique(term_codes.astype(np.int64) * max(n_docs, 1) + docs, return_counts=True)
+        pair_terms = pair_codes // max(n_docs, 1)
+        indptr = np.searchsorted(pair_terms, np.arange(len(terms) + 1))
+        doc_lengths = np.bincount(docs, minlength=n_docs).astype(np.float32)
+
+        return cls(
+            np.asarray(terms, dtype=object),
+            indptr,
+            (pair_codes % max(n_docs, 1)).astype(np.int32 if n_docs < 2**31 else np.int64),
+            counts.astype(np.float32),
+            doc_lengths,
+            **params,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        n_docs = len(self.doc_lengths)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self._avg_length)
+        for term in set(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:stop]
+            tf = self.term_freqs[start:stop]
+            idf = np.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> np.ndarray:
+        """Row positions of the ``k`` best-matching documents, best first."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        return hits[np.argsort(-scores[hits], kind="stable")]
+
+    def rank(self, query: str, positions) -> np.ndarray:
+        """Reorder ``positions`` by relevance to ``query``, keeping ties in place."""
+        positions = np.asarray(positions)
+        scores = self.scores(query)[positions]
+        return positions[np.argsort(-scores, kind="stable")]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            terms=self.terms.astype(str),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b]),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"]
+            return cls(
+                data["terms"].astype(object),
+                data["indptr"],
+                data["doc_ids"],
+                data["term_freqs"],
+                data["doc_lengths"],
+                k1=float(k1),
+                b=float(b),
+            )
+
+
+def _load_or_build(dataset) -> BM25Index:
+    cache_dir = get_setting("BM25_CACHE_DIR", DEFAULT_CACHE_DIR)
+    path = os.path.join(cache_dir, f"{dataset.key}.npz")
+    if os.path.exists(path):
+        try:
+            return BM25Index.load(path)
+        except (OSError, ValueError, KeyError):
+            pass
+    index = BM25Index.build(dataset.df)
+    try:
+        index.save(path)
+    except OSError:
+        pass
+    return index
+
+
+def bm25_index_for(dataset) -> BM25Index:
+    """Return the dataset's BM25 index, loading it from disk or building it on first use."""
+    return dataset.derive("bm25_index", lambda df: _load_or_build(dataset))
@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str = ""):
+    """Return the tiktoken encoding for ``model``, or None if tiktoken can't load one."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # Encodings are downloaded on first use; offline hosts fall back below.
+        return None
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts, model: str = "") -> list:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [max(1, len(t) // 4) if t else 0 for t in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(list(texts), disallowed_special=())]
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "") -> str:
+    """The longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -1,6 +1,8 @@
 import streamlit as st
 from pathlib import Path
-from scripts.llm_chat import ask_llm
+# Keep this entrypoint light: it runs on every page load, so the LLM stack,
+# plotting libraries and pymongo are imported only by the pages using them.
+from app.instrumentation import begin_run, render_perf_panel
 
 
 
@@ -10,6 +12,7 @@ st.set_page_config(
     page_icon="🤖",
     layout="wide",
 )
+begin_run()
 
 
 # === GLOBAL SIDEBAR OPENAI KEY HANDLING ===
@@ -58,3 +61,6 @@ pg = st.navigation(
 
 # --- RUN NAVIGATION ---
 pg.run()
+
+# --- PERFORMANCE PANEL (rendered last so it includes this rerun's spans) ---
+render_perf_panel()
@@ -0,0 +1,12 @@
+import pytest
+
+from scripts.response_cache import ResponseCache
+
+
+@pytest.fixture
+def response_cache(tmp_path, monkeypatch):
+    """A fresh on-disk response cache used by the chat helpers instead of the shared one."""
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=3600, max_entries=100)
+    monkeypatch.setattr("scripts.llm_chat.get_response_cache", lambda: cache)
+    monkeypatch.setattr("scripts.map_reduce.get_response_cache", lambda: cache)
+    return cache
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from app.ingest import read_csv
+from scripts.batch_diagnose import FAKE_DIAGNOSIS, FakeDiagnosisModel, diagnose_all, load_completed, main
+
+CSV = "student_id,question,grade,error_summary,error_category\n" + "".join(
+    f"{student},Q{question},{(student + question) % 2},sign error,Process Skills Error\n"
+    for student in range(1, 11)
+    for question in (1, 2)
+)
+PAIRS = 20
+
+
+class CountingModel(FakeDiagnosisModel):
+    """Counts its calls and, once ``hang_after`` calls have answered, never answers again."""
+
+    calls: int = 0
+    hang_after: int = None
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.hang_after is not None and self.calls > self.hang_after:
+            await asyncio.Event().wait()
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+@pytest.fixture
+def df():
+    return read_csv(CSV.encode("utf-8"))[0]
+
+
+def records(path):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh]
+
+
+def test_diagnose_all_writes_one_record_per_pair(df, tmp_path):
+    output = tmp_path / "diagnoses.jsonl"
+    summary = asyncio.run(diagnose_all(df, FakeDiagnosisModel(), str(output), concurrency=4, progress=False))
+
+    assert summary == {"skipped": 0, "completed": PAIRS, "failed": 0}
+    written = records(output)
+    assert {(r["student_id"], r["question"]) for r in written} == {
+        (student, f"Q{question}") for student in range(1, 11) for question in (1, 2)
+    }
+    assert {r["diagnosis"] for r in written} == {FAKE_DIAGNOSIS}
+
+
+def test_interrupted_run_resumes_without_repeating_pairs(df, tmp_path):
+    output = str(tmp_path / "diagnoses.jsonl")
+    first = CountingModel(hang_after=7)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(diagnose_all(df, first, output, concurrency=1, progress=False), 1.0))
+    assert len(records(output)) == 7
+
+    second = CountingModel()
+    summary = asyncio.run(diagnose_all(df, second, output, concurrency=4, progress=False))
+    assert summary == {"skipped": 7, "completed": PAIRS - 7, "failed": 0}
+    assert second.calls == PAIRS - 7
+    keys = [(r["student_id"], r["question"]) for r in records(output)]
+    assert len(keys) == len(set(keys)) == PAIRS
+
+
+def test_load_completed_truncates_a_torn_last_line(tmp_path):
+    output = tmp_path / "diagnoses.jsonl"
+    complete = "".join(
+        json.dumps({"student_id": s, "question": "Q1", "diagnosis": "ok"}) + "\n" for s in (1, 2)
+    )
+    output.write_text(complete + '{"student_id": 3, "quest')
+
+    assert load_completed(str(output)) == {json.dumps(["1", "Q1"]), json.dumps(["2", "Q1"])}
+    assert output.read_text() == complete
+
+
+def test_cli_runs_with_the_fake_model(tmp_path, capsys):
+    dataset = tmp_path / "responses.csv"
+    dataset.write_text(CSV)
+    output = tmp_path / "out" / "diagnoses.jsonl"
+    parquet = tmp_path / "diagnoses.parquet"
+
+    assert main([str(dataset), "--output", str(output), "--parquet", str(parquet), "--fake-model"]) == 0
+    assert json.loads(capsys.readouterr().out.strip().splitlines()[-1])["completed"] == PAIRS
+    assert parquet.exists()
+    assert main([str(dataset), "--output", str(output), "--fake-model"]) == 0
+    assert json.loads(capsys.readouterr().out.strip().splitlines()[-1]) == {
+        "skipped": PAIRS, "completed": 0, "failed": 0,
+    }
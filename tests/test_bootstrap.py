@@ -0,0 +1,29 @@
+import numpy as np
+
+from app import bootstrap
+from app.bootstrap import _Resampler, _sparse_pairs, bootstrap_intervals
+from app.item_analysis import aggregate_pairs, item_statistics_from_pairs, prepare_responses
+from benchmarks.synthetic import generate_dataset
+
+
+def test_unit_weights_reproduce_item_statistics(monkeypatch):
+    # Small slices, so the products span many densified slices of students.
+    monkeypatch.setattr(bootstrap, "_SLICE_CELLS", 500)
+    pairs = aggregate_pairs(prepare_responses(generate_dataset(5_000, seed=3)))
+    questions, n_students, s_rank, q_codes, values = _sparse_pairs(pairs)
+    resampler = _Resampler(n_students, s_rank, q_codes, values, len(questions), 0.27)
+    difficulty, discrimination = resampler.statistics(np.ones((1, n_students)))
+
+    expected = item_statistics_from_pairs(pairs)
+    np.testing.assert_allclose(difficulty[0], expected["difficulty_index"])
+    np.testing.assert_allclose(discrimination[0], expected["discrimination_index"])
+
+
+def test_intervals_bracket_the_point_estimates():
+    pairs = aggregate_pairs(prepare_responses(generate_dataset(5_000, seed=3)))
+    intervals = bootstrap_intervals(pairs, n_resamples=300)
+    expected = item_statistics_from_pairs(pairs)
+    assert list(intervals["question"]) == list(expected["question"])
+    assert (intervals["difficulty_low"] <= expected["difficulty_index"] + 1e-9).all()
+    assert (intervals["difficulty_high"] >= expected["difficulty_index"] - 1e-9).all()
+    assert intervals.equals(bootstrap_intervals(pairs, n_resamples=300))
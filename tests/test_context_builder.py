@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from scripts.context_builder import ContextIndex, build_context
+
+
+@pytest.fixture
+def index():
+    return ContextIndex(pd.DataFrame({
+        "student_id": [1001, 1002, 1003, 1004],
+        "question": ["Q1", "Q2", "Q1", "Q2"],
+        "grade": [1, 0, 1, 0],
+    }))
+
+
+@pytest.mark.parametrize("query", [
+    "How did students do on Q1 in 2024?",
+    "Did Q2 get harder between 2023 and 2024?",
+    "Which students scored 85 or more on Q1?",
+    "Q1 had 3 error types in the 10-item quiz",
+])
+def test_years_and_numbers_in_text_are_not_student_ids(index, query):
+    _, _, unknown = index.extract_entities(query)
+    assert unknown == []
+    assert "not found" not in build_context(index, query)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("How did student 2024 do?", ["2024"]),
+    ("Show id #77 on Q1", ["77"]),
+    ("Compare 1002 with 1099", ["1099"]),
+])
+def test_unknown_ids_in_id_position_or_id_shape_are_reported(index, query, expected):
+    _, _, unknown = index.extract_entities(query)
+    assert unknown == expected
+    assert f"Student IDs not found in the dataset: {', '.join(expected)}." in build_context(index, query)
+
+
+def test_known_students_and_questions_are_resolved(index):
+    students, questions, unknown = index.extract_entities("How did student 1002 do on question 2?")
+    assert (students, questions, unknown) == (["1002"], ["q2"], [])
+    assert "Rows matching student_id 1002 and question Q2." in build_context(index, "student 1002 on Q2")
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.data_store import Dataset
+from app.error_index import error_index_for
+from app.error_labels import canonical_mapping, cluster_labels, connected_components, same_words
+
+VOCABULARY = [
+    "sign error", "sign errors", "sign eror", "sine error", "size error", "sign mistake", "wrong sign",
+    "add", "and", "place value error", "place-value error", "decimal error", "decimal point error",
+    "misread question", "misread the question",
+]
+
+
+def mapping():
+    # Earlier labels are more frequent, so they name their clusters.
+    return canonical_mapping(pd.Series(np.arange(len(VOCABULARY), 0, -1), index=VOCABULARY))
+
+
+@pytest.mark.parametrize("variant, canonical", [
+    ("sign errors", "sign error"),
+    ("sign eror", "sign error"),
+    ("place-value error", "place value error"),
+    ("misread the question", "misread question"),
+])
+def test_spelling_variants_merge(variant, canonical):
+    assert mapping()[variant] == canonical
+
+
+@pytest.mark.parametrize("label", [
+    "sine error", "size error", "sign mistake", "wrong sign", "add", "and", "decimal point error",
+])
+def test_distinct_labels_stay_apart(label):
+    assert mapping()[label] == label
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("sign error", "sign eror", True),
+    ("rounding error", "roundign error", True),
+    ("unit error", "units error", True),
+    ("sine error", "size error", False),
+    ("sign error", "sing error", False),
+    ("add", "and", False),
+    ("decimal error", "decimal point error", False),
+])
+def test_same_words(a, b, expected):
+    assert same_words(a, b) is expected
+
+
+def test_connected_components_follow_chains():
+    edges = np.array([[3, 4], [0, 1], [1, 2], [5, 4]])
+    assert connected_components(7, edges).tolist() == [0, 0, 0, 3, 3, 3, 6]
+    assert connected_components(3, np.empty((0, 2), dtype=np.int64)).tolist() == [0, 1, 2]
+
+
+def test_cluster_labels_handles_tiny_inputs():
+    assert cluster_labels([]).tolist() == []
+    assert cluster_labels(["sign error"]).tolist() == [0]
+
+
+def test_error_index_counts_canonical_labels():
+    df = pd.DataFrame({
+        "question": ["Q1"] * 5,
+        "error_summary": ["sign error", "Sign errors", "sign eror, size error", "size error", "sine error"],
+    })
+    index = error_index_for(Dataset("labels", df), "error_summary")
+    freqs = index.frequencies("Q1")
+    assert dict(zip(freqs["Label"], freqs["Frequency"])) == {"sign error": 3, "size error": 2, "sine error": 1}
@@ -0,0 +1,29 @@
+import pytest
+
+from app import instrumentation
+from app.instrumentation import SpanRecorder, annotate, span
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = SpanRecorder()
+    monkeypatch.setattr(instrumentation, "get_recorder", lambda: recorder)
+    return recorder
+
+
+def test_nested_spans_with_equal_attributes_close_in_order(recorder):
+    with span("outer"):
+        with span("inner"):
+            pass
+        annotate(rows=3)
+
+    assert recorder._open == []
+    spans = {s["span"]: s for s in recorder.spans}
+    assert spans["outer"]["rows"] == 3
+    assert "rows" not in spans["inner"]
+
+
+def test_span_closing_after_a_rerun_started(recorder):
+    with span("stream"):
+        recorder.begin_run()
+    assert [s["span"] for s in recorder.spans] == ["stream"]
@@ -0,0 +1,56 @@
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from scripts.llm_chat import stream_llm
+
+ANSWER = "Most errors on Q3 are sign errors."
+
+
+def fake_llm(*answers):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=answer) for answer in answers]))
+
+
+def test_stream_llm_yields_chunks_and_records_metrics(response_cache):
+    metrics = {}
+    chunks = list(stream_llm("What goes wrong on Q3?", "context", "", metrics, llm=fake_llm(ANSWER)))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == ANSWER
+    assert metrics["chunks"] == len(chunks)
+    assert metrics["cache_hit"] is False
+    assert 0 <= metrics["ttft_s"] <= metrics["total_s"]
+
+
+def test_stream_llm_serves_repeated_questions_from_the_cache(response_cache):
+    list(stream_llm("What goes wrong on Q3?", "context", "", {}, llm=fake_llm(ANSWER)))
+
+    metrics = {}
+    # A second model call would raise StopIteration: the answer must come from the cache.
+    chunks = list(stream_llm("What goes wrong on Q3?", "context", "", metrics, llm=fake_llm()))
+    assert chunks == [ANSWER]
+    assert metrics["cache_hit"] is True
+    assert metrics["chunks"] == 1
+    assert response_cache.stats()["hits"] == 1
+
+
+def test_stream_llm_cache_key_covers_context_and_digest(response_cache):
+    list(stream_llm("What goes wrong on Q3?", "context", "", {}, llm=fake_llm(ANSWER)))
+    metrics = {}
+    chunks = list(stream_llm("What goes wrong on Q3?", "other context", "", metrics, llm=fake_llm("Different.")))
+    assert "".join(chunks) == "Different."
+    metrics = {}
+    list(stream_llm("What goes wrong on Q3?", "context", "", metrics, llm=fake_llm("New digest."), digest="d2"))
+    assert metrics["cache_hit"] is False
+
+
+def test_stream_llm_reports_model_failures(response_cache):
+    class Failing(GenericFakeChatModel):
+        def _stream(self, *args, **kwargs):
+            raise ValueError("boom")
+
+    metrics = {}
+    chunks = list(stream_llm("Q?", "", "", metrics, llm=Failing(messages=iter([]))))
+    assert chunks == ["⚠️ Failed to fetch response from LLM: boom"]
+    assert metrics["error"] == "ValueError"
+    assert "total_s" in metrics
+    assert response_cache.stats()["entries"] == 0
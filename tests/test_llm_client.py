@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts import llm_client
+from scripts.llm_client import LLMClientManager
+
+
+def completion(text):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    }
+
+
+def sse_chunk(text):
+    chunk = {
+        "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+        "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+
+class StubServer:
+    """An OpenAI-compatible chat endpoint answering with scripted statuses, then 200s.
+
+    ``"truncated"`` in the script starts a streamed response and drops the
+    connection after its first chunk.
+    """
+
+    def __init__(self, script=(), delay_s=0.0):
+        self.script = list(script)
+        self.delay_s = delay_s
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                    step = stub.script.pop(0) if stub.script else 200
+                try:
+                    time.sleep(stub.delay_s)
+                    if step == "truncated":
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Content-Length", "100000")
+                        self.end_headers()
+                        self.wfile.write(sse_chunk("Hel"))
+                        self.wfile.flush()
+                        self.close_connection = True
+                    elif step != 200:
+                        self._send(step, {"error": {"message": f"status {step}", "type": "server_error"}})
+                    elif body.get("stream"):
+                        data = sse_chunk("Hel") + sse_chunk("lo") + b"data: [DONE]\n\n"
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        self.wfile.write(data)
+                    else:
+                        self._send(200, completion("Hello"))
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*script, delay_s=0.0):
+        servers.append(StubServer(script, delay_s))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def manager_for(server, **kwargs):
+    return LLMClientManager(base_url=server.url, max_wait_s=0.01, timeout_s=10, **kwargs)
+
+
+def test_call_retries_rate_limits_and_server_errors(stub):
+    server = stub(429, 500)
+    manager = manager_for(server)
+    llm = manager.get_llm("sk-test", "stub")
+    response = manager.call(llm, lambda: llm.invoke("hi"))
+    assert response.content == "Hello"
+    assert server.requests == 3
+
+
+def test_call_gives_up_after_max_attempts(stub):
+    server = stub(500, 500, 500)
+    manager = manager_for(server, max_attempts=2)
+    llm = manager.get_llm("sk-test", "stub")
+    with pytest.raises(Exception, match="status 500"):
+        manager.call(llm, lambda: llm.invoke("hi"))
+    assert server.requests == 2
+
+
+def test_sync_and_async_calls_share_the_per_key_limit(stub):
+    server = stub(delay_s=0.05)
+    manager = manager_for(server, max_concurrency=2)
+    llm = manager.get_llm("sk-test", "stub")
+
+    async def burst():
+        async with manager.async_llm(llm) as async_llm:
+            return await asyncio.gather(*(manager.acall(llm, lambda: async_llm.ainvoke("hi")) for _ in range(4)))
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        sync = [pool.submit(manager.call, llm, lambda: llm.invoke("hi")) for _ in range(6)]
+        async_runs = [pool.submit(asyncio.run, burst()) for _ in range(2)]
+        results = [f.result().content for f in sync] + [r.content for f in async_runs for r in f.result()]
+
+    assert results == ["Hello"] * 14
+    assert server.requests == 14
+    assert server.peak <= 2
+
+
+def test_stream_retries_only_until_the_first_chunk(stub, monkeypatch):
+    server = stub(500)
+    manager = manager_for(server)
+    llm = manager.get_llm("sk-test", "stub")
+    chunks = [chunk.content for chunk in manager.stream(llm, lambda: llm.stream("hi"))]
+    assert "".join(chunks) == "Hello"
+    assert server.requests == 2
+
+    # Every failure counts as retryable here, so only the first-chunk rule stops a retry.
+    monkeypatch.setattr(llm_client, "_is_retryable", lambda exc: True)
+    server = stub("truncated")
+    manager = manager_for(server)
+    llm = manager.get_llm("sk-test", "stub")
+    received = []
+    with pytest.raises(Exception):
+        for chunk in manager.stream(llm, lambda: llm.stream("hi")):
+            received.append(chunk.content)
+    assert received[:1] == ["Hel"]
+    assert server.requests == 1
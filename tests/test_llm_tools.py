@@ -0,0 +1,165 @@
+import json
+import logging
+
+import pytest
+from langchain_core.language_models import BaseChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.data_store import Dataset
+from app.ingest import read_csv
+from scripts.dataset_digest import digest_for
+from scripts.llm_chat import ask_llm, stream_llm
+from scripts.llm_tools import analytics_tools_for, run_tool_loop
+
+CSV = (
+    "student_id,question,grade,error_summary,error_category\n"
+    + "".join(
+        f"{student},Q{question},{(student + question) % 2},sign error,Process Skills Error\n"
+        for student in range(1, 21)
+        for question in (1, 2)
+    )
+)
+
+
+def tool_call(name, args, call_id, input_tokens=100, output_tokens=10):
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": name, "args": args, "id": call_id}],
+        usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                        "total_tokens": input_tokens + output_tokens},
+    )
+
+
+def answer(text, input_tokens=150, output_tokens=20):
+    return AIMessage(content=text, usage_metadata={
+        "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+    })
+
+
+class StreamingScript(BaseChatModel):
+    """Streams scripted replies: tool calls as one chunk, answers word by word with usage at the end."""
+
+    replies: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-script"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self.replies.pop(0))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self.replies.pop(0)
+        if reply.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                for call in reply.tool_calls
+            ]))
+        else:
+            for word in reply.content.split(" "):
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=reply.usage_metadata))
+
+
+@pytest.fixture
+def dataset():
+    df, _ = read_csv(CSV.encode("utf-8"))
+    return Dataset("test", df, "test.csv")
+
+
+def test_ask_llm_runs_tools_and_counts_usage_once(dataset, caplog):
+    llm = GenericFakeChatModel(messages=iter([
+        tool_call("question_statistics", {"question": "Q1"}, "call-1"),
+        answer("Q1 has a difficulty index of 0.5."),
+    ]))
+    trace = []
+    with caplog.at_level(logging.INFO, logger="scripts.llm_client"):
+        result = ask_llm("How hard is Q1?", llm=llm, use_cache=False, tools=analytics_tools_for(dataset),
+                         trace=trace)
+
+    assert result == "Q1 has a difficulty index of 0.5."
+    assert [(call["tool"], call["args"]) for call in trace] == [("question_statistics", {"question": "Q1"})]
+    assert trace[0]["result_chars"] > 0
+    (usage_line,) = [r.getMessage() for r in caplog.records if r.getMessage().startswith("LLM usage")]
+    assert "input_tokens=250 " in usage_line
+    assert "total_tokens=280" in usage_line
+
+
+def test_stream_llm_streams_the_answer_after_tool_calls(dataset, response_cache):
+    llm = StreamingScript(replies=[
+        tool_call("question_statistics", {"question": "Q1"}, "call-1"),
+        answer("Q1 has a difficulty index of 0.5."),
+    ])
+    metrics, trace = {}, []
+    chunks = list(stream_llm("How hard is Q1?", "", "", metrics, llm=llm, tools=analytics_tools_for(dataset),
+                             trace=trace))
+
+    assert "".join(chunks).strip() == "Q1 has a difficulty index of 0.5."
+    assert len(chunks) > 1
+    assert [(call["tool"], call["args"]) for call in trace] == [("question_statistics", {"question": "Q1"})]
+    assert metrics["tool_calls"] == 1
+    assert metrics["chunks"] == len(chunks)
+    assert 0 <= metrics["ttft_s"] <= metrics["total_s"]
+    assert (metrics["input_tokens"], metrics["total_tokens"]) == (250, 280)
+
+
+def test_cached_tool_answers_are_kept_apart_per_dataset(response_cache):
+    # Student 5 and 6 swap their Q1 errors: the digests match, the datasets do not.
+    datasets = []
+    for key, (label_5, label_6) in (("a", ("sign error", "none")), ("b", ("none", "sign error"))):
+        csv = CSV.replace("5,Q1,0,sign error", f"5,Q1,0,{label_5}").replace("6,Q1,1,sign error", f"6,Q1,1,{label_6}")
+        df, _ = read_csv(csv.encode("utf-8"))
+        datasets.append(Dataset(key, df, "students.csv"))
+    assert digest_for(datasets[0]) == digest_for(datasets[1])
+
+    answers = []
+    for ds, true_label in zip(datasets, ("sign error", "none")):
+        llm = GenericFakeChatModel(messages=iter([
+            tool_call("student_history", {"student_id": "5"}, "call-1"),
+            answer(true_label),
+        ]))
+        answers.append(ask_llm("What error did student 5 make on Q1?", llm=llm, tools=analytics_tools_for(ds),
+                               digest=digest_for(ds), dataset_key=ds.key))
+    assert answers == ["sign error", "none"]
+
+
+def test_tool_results_are_exact_statistics(dataset):
+    tools = {tool.name: tool for tool in analytics_tools_for(dataset)}
+    (row,) = json.loads(tools["question_statistics"].invoke({"question": "Q1"}))
+    assert row["question"] == "Q1"
+    assert row["difficulty_index"] == pytest.approx(0.5)
+    history = json.loads(tools["student_history"].invoke({"student_id": "3"}))
+    assert history["responses"] == 2
+    missing = json.loads(tools["student_history"].invoke({"student_id": "999"}))
+    assert "not found" in missing["error"]
+
+
+def test_unknown_tool_and_bad_arguments_are_reported_to_the_model(dataset):
+    llm = GenericFakeChatModel(messages=iter([
+        tool_call("no_such_tool", {}, "call-1"),
+        tool_call("top_error_types", {"question": "Q9"}, "call-2"),
+        answer("Done."),
+    ]))
+    messages = [HumanMessage(content="Top errors on Q9?")]
+    trace = []
+    response = run_tool_loop(llm, messages, analytics_tools_for(dataset), lambda model, msgs: model.invoke(msgs),
+                             trace=trace)
+    assert response.content == "Done."
+    results = [json.loads(m.content) for m in messages if isinstance(m, ToolMessage)]
+    assert "Unknown tool" in results[0]["error"]
+    assert "Unknown question" in results[1]["error"]
+    assert [call["tool"] for call in trace] == ["no_such_tool", "top_error_types"]
+
+
+def test_final_answer_is_appended_when_rounds_run_out(dataset):
+    llm = GenericFakeChatModel(messages=iter([
+        tool_call("question_statistics", {}, "call-1"),
+        answer("Best effort answer."),
+    ]))
+    messages = [HumanMessage(content="Summarize every question.")]
+    response = run_tool_loop(llm, messages, analytics_tools_for(dataset), lambda model, msgs: model.invoke(msgs),
+                             max_rounds=1)
+    assert response.content == "Best effort answer."
+    assert messages[-1] is response
+    assert sum(1 for m in messages if isinstance(m, AIMessage)) == 2
@@ -0,0 +1,109 @@
+import asyncio
+import re
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.data_store import Dataset
+from app.ingest import read_csv
+from scripts.map_reduce import answer_whole_dataset, map_reduce, partition
+from scripts.tokens import count_tokens
+
+CSV = "student_id,question,grade,error_summary,error_category\n" + "".join(
+    f"{student},Q{question},{(student * question) % 3 / 2},sign error,Process Skills Error\n"
+    for student in range(1, 41)
+    for question in range(1, 4)
+)
+
+
+class ScriptedModel(BaseChatModel):
+    """Answers map prompts with the part's label and reduce prompts with how many partials they combine."""
+
+    calls: list = []
+    fail: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _answer(self, messages) -> ChatResult:
+        if self.fail:
+            raise AssertionError("the model should not be called")
+        prompt = messages[-1].content
+        self.calls.append(prompt)
+        label = re.search(r"one part of a larger dataset \((.+?)\)", prompt)
+        if label:
+            text = f"summary of {label.group(1)}"
+        else:
+            text = f"combined {prompt.count('[Partial answer for')} partials"
+        message = AIMessage(content=text, usage_metadata={"input_tokens": 10, "output_tokens": 2, "total_tokens": 12})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._answer(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(0)
+        return self._answer(messages)
+
+
+@pytest.fixture
+def dataset():
+    df, _ = read_csv(CSV.encode("utf-8"))
+    return Dataset("map-reduce-test", df, "test.csv")
+
+
+def test_partition_by_question_keeps_chunks_within_budget(dataset):
+    chunks = partition(dataset.df, "question", budget=200)
+    assert {label for label, _ in chunks} == {"question Q1", "question Q2", "question Q3"}
+    assert len(chunks) > 3
+    assert all(count_tokens(text) <= 200 for _, text in chunks)
+    rows = sum(len(text.splitlines()) - 1 for _, text in chunks)
+    assert rows == len(dataset.df)
+
+
+def test_partition_by_chunk_covers_every_row(dataset):
+    chunks = partition(dataset.df, "chunk", budget=300)
+    assert chunks[0][0].startswith("rows 1-")
+    assert chunks[-1][0].endswith(f"-{len(dataset.df)}")
+
+
+def test_map_reduce_reports_progress_and_usage(dataset):
+    llm = ScriptedModel(calls=[])
+    chunks = partition(dataset.df, "question", budget=200)
+    progress, usage = [], {}
+    answer = asyncio.run(map_reduce(llm, chunks, "Which errors dominate?", budget=2000, concurrency=2,
+                                    on_progress=lambda *event: progress.append(event), usage=usage))
+
+    assert answer == f"combined {len(chunks)} partials"
+    assert progress[0] == ("map", 0, len(chunks))
+    assert ("map", len(chunks), len(chunks)) in progress
+    assert progress[-1] == ("reduce", 1, 1)
+    assert len(llm.calls) == len(chunks) + 1
+    assert usage == {"input_tokens": 10 * len(llm.calls), "output_tokens": 2 * len(llm.calls),
+                     "total_tokens": 12 * len(llm.calls)}
+
+
+def test_partials_over_budget_are_reduced_in_rounds(dataset):
+    llm = ScriptedModel(calls=[])
+    chunks = partition(dataset.df, "question", budget=200)
+    stages = set()
+    asyncio.run(map_reduce(llm, chunks, "Which errors dominate?", budget=30,
+                           on_progress=lambda stage, done, total: stages.add(stage)))
+    assert "reduce 1" in stages
+
+
+def test_answer_whole_dataset_caches_the_final_answer(dataset, response_cache):
+    llm = ScriptedModel(calls=[])
+    first = answer_whole_dataset(dataset, "Which errors dominate?", llm=llm, budget=200)
+    assert first.startswith("combined")
+    assert response_cache.stats()["entries"] == 1
+
+    cached = answer_whole_dataset(dataset, "Which errors dominate?", llm=ScriptedModel(calls=[], fail=True),
+                                  budget=200)
+    assert cached == first
+    other = answer_whole_dataset(dataset, "Which errors dominate?", llm=ScriptedModel(calls=[], fail=True),
+                                 budget=200, by="chunk")
+    assert other.startswith("⚠️ Failed to fetch response from LLM")
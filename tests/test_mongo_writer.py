@@ -0,0 +1,144 @@
+import time
+
+import pytest
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from forms.mongo_writer import BackgroundMongoWriter
+
+
+class FakeCollection:
+    """In-process stand-in for a Mongo collection: can be down, and rejects flagged documents."""
+
+    def __init__(self):
+        self.docs = {}
+        self.down = False
+
+    def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise ServerSelectionTimeoutError("mongo is down")
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc.get("invalid"):
+                errors.append({"index": i, "code": 121, "errmsg": "Document failed validation"})
+            elif doc["_id"] in self.docs:
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("condition not met in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def collection():
+    return FakeCollection()
+
+
+@pytest.fixture
+def writer(collection, tmp_path):
+    writer = BackgroundMongoWriter(lambda: collection, spool_path=str(tmp_path / "spool.sqlite3"),
+                                   flush_interval_s=0.02)
+    yield writer
+    writer.close()
+
+
+def test_batches_are_written(writer, collection):
+    for i in range(120):
+        writer.submit({"n": i})
+    assert writer.flush(5)
+    assert sorted(doc["n"] for doc in collection.docs.values()) == list(range(120))
+    assert writer.stats()["spooled"] == 0
+
+
+def test_spools_while_down_and_replays_on_recovery(writer, collection):
+    collection.down = True
+    for i in range(10):
+        writer.submit({"n": i})
+    assert writer.flush(5)
+    assert writer.stats()["spooled"] == 10
+    assert writer.stats()["failures"] >= 1
+    assert not collection.docs
+
+    collection.down = False
+    writer._retry_at = 0.0  # skip the backoff
+    wait_for(lambda: writer.stats()["spooled"] == 0)
+    assert len(collection.docs) == 10
+
+
+def test_replayed_duplicates_are_not_written_twice(writer, collection):
+    writer.submit({"n": 1})
+    assert writer.flush(5)
+    (doc,) = collection.docs.values()
+    writer.spool.push([doc])
+    wait_for(lambda: writer.stats()["spooled"] == 0)
+    assert len(collection.docs) == 1
+
+
+def test_rejected_document_is_dead_lettered(writer, collection):
+    collection.down = True
+    writer.submit({"n": 0, "invalid": True})
+    for i in range(1, 5):
+        writer.submit({"n": i})
+    assert writer.flush(5)
+    assert writer.stats()["spooled"] == 5
+
+    collection.down = False
+    writer._retry_at = 0.0
+    wait_for(lambda: writer.stats()["spooled"] == 0)
+    # The rejected document no longer blocks the ones behind it.
+    assert sorted(doc["n"] for doc in collection.docs.values()) == [1, 2, 3, 4]
+    assert writer.stats()["rejected"] == 1
+    ((doc, error),) = writer.spool.dead_letters()
+    assert doc["n"] == 0
+    assert "validation" in error
+
+    writer.submit({"n": 5})
+    assert writer.flush(5)
+    assert len(collection.docs) == 5
+
+
+def test_unencodable_document_is_dead_lettered(tmp_path, collection):
+    from bson.errors import InvalidDocument
+
+    def insert_many(docs, ordered=True):
+        if any(isinstance(doc.get("payload"), set) for doc in docs):
+            raise InvalidDocument("cannot encode object: set()")
+        return FakeCollection.insert_many(collection, docs, ordered)
+
+    collection.insert_many = insert_many
+    writer = BackgroundMongoWriter(lambda: collection, spool_path=str(tmp_path / "spool.sqlite3"),
+                                   flush_interval_s=0.02)
+    try:
+        writer.submit({"n": 0, "payload": set()})
+        writer.submit({"n": 1})
+        assert writer.flush(5)
+        assert [doc["n"] for doc in collection.docs.values()] == [1]
+        assert writer.stats()["rejected"] == 1
+    finally:
+        writer.close()
+
+
+def test_worker_survives_spool_errors(writer, collection, monkeypatch):
+    import sqlite3
+
+    calls = {"n": 0}
+    peek = writer.spool.peek
+
+    def failing_peek(limit):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return peek(limit)
+
+    monkeypatch.setattr(writer.spool, "peek", failing_peek)
+    wait_for(lambda: calls["n"] > 1)
+    writer.submit({"n": 1})
+    assert writer.flush(5)
+    assert len(collection.docs) == 1
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.data_store import Dataset
+from scripts.retrieval import BM25Index, bm25_index_for, tokenize
+
+DOCS = pd.DataFrame({
+    "error_summary": ["sign error", "sign error, rounding", "place value", "misread the question", None],
+    "llm_response": [
+        "The student flipped the sign when moving terms.",
+        "Sign flipped and the answer was rounded too early.",
+        "Digits were written in the wrong place value column.",
+        "The student misread what the question asked.",
+        "No response recorded.",
+    ],
+})
+
+
+def hand_bm25(docs, query, k1=1.5, b=0.75):
+    """Textbook BM25 with the Lucene idf, one document per row."""
+    tokens = [tokenize(" ".join(str(v) for v in row if isinstance(v, str))) for row in docs]
+    avg = sum(map(len, tokens)) / len(tokens)
+    scores = []
+    for doc in tokens:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in tokens)
+            tf = doc.count(term)
+            if not df or not tf:
+                continue
+            idf = math.log(1 + (len(tokens) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg))
+        scores.append(score)
+    return scores
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(DOCS)
+
+
+@pytest.mark.parametrize("query", ["sign flipped", "student question", "place value digits", "unrelated words"])
+def test_scores_match_hand_computed_bm25(index, query):
+    expected = hand_bm25(DOCS[["error_summary", "llm_response"]].itertuples(index=False), query)
+    np.testing.assert_allclose(index.scores(query), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_search_and_rank_order_by_score(index):
+    assert index.search("sign flipped rounded").tolist() == [1, 0]
+    assert index.search("sign flipped rounded", k=1).tolist() == [1]
+    assert index.search("unrelated words").tolist() == []
+    # Rows without a match keep their relative order behind the matches.
+    assert index.rank("misread question", [0, 2, 3, 4]).tolist() == [3, 0, 2, 4]
+
+
+def test_saved_index_loads_with_identical_results(index, tmp_path):
+    path = str(tmp_path / "bm25" / "docs.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    for query in ("sign flipped", "student question", "place value"):
+        np.testing.assert_array_equal(loaded.scores(query), index.scores(query))
+        assert loaded.search(query).tolist() == index.search(query).tolist()
+
+
+def test_bm25_index_for_reuses_the_cached_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("BM25_CACHE_DIR", str(tmp_path))
+    built = bm25_index_for(Dataset("docs-key", DOCS))
+    assert (tmp_path / "docs-key.npz").exists()
+
+    monkeypatch.setattr(BM25Index, "build", classmethod(lambda cls, df: pytest.fail("index rebuilt")))
+    loaded = bm25_index_for(Dataset("docs-key", DOCS))
+    assert loaded.search("sign flipped").tolist() == built.search("sign flipped").tolist()
@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
 import io
-from scripts.llm_chat import ask_llm
+from app.data_store import load_dataset
+from app.instrumentation import span
+from app.settings import get_setting
+from scripts.chat_history import DEFAULT_HISTORY_BUDGET, ChatHistory
+from scripts.context_builder import DEFAULT_TOKEN_BUDGET, build_context, context_index_for
+from scripts.dataset_digest import digest_for
+from scripts.retrieval import DEFAULT_TOP_K, bm25_index_for
 
 st.set_page_config(layout="wide")
 st.title("🤖 Educational Feedback Chatbot")
@@ -9,16 +14,19 @@ st.title("🤖 Educational Feedback Chatbot")
 # === File Upload ===
 uploaded_file = st.sidebar.file_uploader("Upload CSV file", type="csv")
 
+dataset = None
 df = None
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
+        dataset = load_dataset(uploaded_file)
+        df = dataset.df
         st.success("✅ Your dataset was loaded successfully.")
     except Exception as e:
         st.error(f"Failed to read uploaded file: {e}")
 else:
     try:
-        df = pd.read_csv("data/predicting_students_errors.csv")
+        dataset = load_dataset()
+        df = dataset.df
         st.info("📁 Using default dataset: `data/predicting_students_errors.csv`")
     except FileNotFoundError:
         st.warning("⚠️ Please upload a dataset to begin.")
@@ -27,6 +35,11 @@ else:
 # === Chat history session ===
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "history_memory" not in st.session_state:
+    st.session_state.history_memory = ChatHistory(
+        budget=int(get_setting("HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_BUDGET)),
+        model=get_setting("OPENAI_MODEL", "gpt-4o"),
+    )
 
 # === Chatbot UI ===
 if df is not None:
@@ -34,16 +47,91 @@ if df is not None:
 
     user_query = st.text_input("Type your question:")
 
+    answer_mode = st.sidebar.radio(
+        "Answer mode",
+        ["🧮 Analytics tools", "🔎 Matching rows", "🗺️ Whole dataset (map-reduce)"],
+        key="answer_mode",
+        help="Analytics tools: the model calls exact local statistics (difficulty, error types, NEA shares, "
+             "student history). Matching rows: the rows about the students/questions you mention. "
+             "Whole dataset: every row is summarized in chunks and the partial answers are combined.",
+    )
+    if answer_mode.startswith("🗺️"):
+        partition_by = st.sidebar.selectbox(
+            "Partition by", ["question", "chunk"], key="map_reduce_partition",
+            help="One or more chunks per question, or consecutive rows up to the token budget.",
+        )
+
     if user_query and st.button("Ask"):
-        context = df.head(100).to_csv(index=False)
-        chat_history_text = "\n".join([f"User: {q}\nBot: {a}" for q, a in st.session_state.chat_history])
-        try:
-            with st.spinner("🤖 Thinking... Please wait..."):
-                answer = ask_llm(user_query, context, chat_history_text)
-            st.session_state.chat_history.append((user_query, answer))
-            st.markdown(f"**Answer:** {answer}")
-        except Exception as e:
-            st.error(f"Error during GPT processing: {e}")
+        # Imported on first question: the LLM stack is the slowest import in the app.
+        from scripts.llm_chat import stream_llm, summarize_history
+
+        memory = st.session_state.history_memory
+        chat_history_text = memory.render(st.session_state.chat_history)
+        if answer_mode.startswith("🗺️"):
+            from scripts.map_reduce import answer_whole_dataset
+
+            progress = st.progress(0.0, text="Partitioning the dataset...")
+
+            def on_progress(stage, done, total):
+                label = "Reading chunks" if stage == "map" else "Combining partial answers"
+                progress.progress(done / max(total, 1), text=f"{label}: {done}/{total}")
+
+            try:
+                answer = answer_whole_dataset(
+                    dataset, user_query, chat_history_text, by=partition_by, on_progress=on_progress,
+                )
+                progress.empty()
+                st.markdown("**Answer:**")
+                st.markdown(answer)
+                st.session_state.chat_history.append((user_query, answer.strip()))
+            except Exception as e:
+                st.error(f"Error during GPT processing: {e}")
+        else:
+            tools = None
+            if answer_mode.startswith("🧮"):
+                from scripts.llm_tools import analytics_tools_for
+
+                # The model fetches exact statistics through the tools instead of reading rows.
+                tools = analytics_tools_for(dataset)
+                context = ""
+            else:
+                with span("build_context", rows=len(df)) as record:
+                    context = build_context(
+                        context_index_for(dataset),
+                        user_query,
+                        budget=int(get_setting("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+                        model=get_setting("OPENAI_MODEL", "gpt-4o"),
+                        retriever=bm25_index_for(dataset),
+                        top_k=int(get_setting("RETRIEVAL_TOP_K", DEFAULT_TOP_K)),
+                    )
+                    record["context_chars"] = len(context)
+            try:
+                metrics = {}
+                trace = []
+                st.markdown("**Answer:**")
+                answer = st.write_stream(stream_llm(
+                    user_query, context, chat_history_text, metrics, digest=digest_for(dataset),
+                    dataset_key=dataset.key, tools=tools, trace=trace,
+                ))
+                st.session_state.chat_history.append((user_query, answer.strip()))
+                st.session_state.setdefault("llm_metrics", []).append(metrics)
+                if metrics.get("cache_hit"):
+                    st.caption("⚡ Served from the response cache.")
+                elif "ttft_s" in metrics:
+                    caption = f"⏱️ First token after {metrics['ttft_s']:.2f}s · completed in {metrics['total_s']:.2f}s"
+                    if "input_tokens" in metrics:
+                        caption += f" · {metrics.get('cached_tokens', 0):,}/{metrics['input_tokens']:,} prompt tokens cached"
+                    st.caption(caption)
+                if trace:
+                    with st.expander(f"🧮 {len(trace)} tool calls"):
+                        st.json(trace)
+            except Exception as e:
+                st.error(f"Error during GPT processing: {e}")
+
+        # Folded after the answer is shown, so the summary call never delays one.
+        if memory.needs_fold(st.session_state.chat_history):
+            with st.spinner("Summarizing earlier conversation..."):
+                memory.fold(st.session_state.chat_history, summarize_history)
 
     if st.session_state.chat_history:
         st.subheader("🗒️ Chat History")
@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
 
+from app import analytics
 from app import visualizations as vis
+from app.bootstrap import bootstrap_settings, intervals_for
+from app.data_store import load_dataset
+from app.ingest import MissingColumnsError
+from app.error_index import error_index_for
+from app.stats_store import stats_store_for
 
 st.set_page_config(page_title="Educational Feedback Analysis Assistant", layout="wide")
 st.title("📊 Educational Feedback Analysis Assistant")
@@ -17,6 +22,7 @@ st.markdown(
     - Evaluate **question difficulty and discrimination**
     - View **common error types** and their proportions
     - Identify patterns from **NEA error categories**
+    - Compare error patterns across **all questions** at once
 
     ### 📂 Dataset Options
 
@@ -28,33 +34,55 @@ st.markdown(
 uploaded_file = st.sidebar.file_uploader("Upload CSV file", type="csv")
 
 # Initialize session state for toggles
-for key in ["show_grade_dist", "show_difficulty", "show_top_errors", "show_pie_chart"]:
+for key in ["show_grade_dist", "show_difficulty", "show_top_errors", "show_pie_chart", "show_heatmaps"]:
     if key not in st.session_state:
         st.session_state[key] = False
 
-# Load dataset
+# Load dataset (required columns are checked from the header before parsing)
+REQUIRED_COLS = ["question", "grade", "student_id"]
+dataset = None
 df = None
-if uploaded_file is not None:
-    try:
-        df = pd.read_csv(uploaded_file)
+try:
+    if uploaded_file is not None:
+        dataset = load_dataset(uploaded_file, required=REQUIRED_COLS)
         st.success("✅ Data loaded successfully!")
-    except Exception as e:
-        st.error(f"Error loading file: {e}")
-        df = None
-else:
-    try:
-        df = pd.read_csv("data/predicting_students_errors.csv")
+    else:
+        dataset = load_dataset(required=REQUIRED_COLS)
         st.info("Default dataset loaded.")
-    except FileNotFoundError:
-        st.warning("Please upload a dataset to begin.")
+    df = dataset.df
+except MissingColumnsError as e:
+    st.error(str(e))
+    st.stop()
+except FileNotFoundError:
+    st.warning("Please upload a dataset to begin.")
+except Exception as e:
+    st.error(f"Error loading file: {e}")
+
+if dataset is not None and dataset.report:
+    report = dataset.report
+    caption = (
+        f"{report['rows']:,} rows · {report['frame_bytes'] / 2**20:.1f} MB in memory · "
+        f"peak {report['peak_arrow_bytes'] / 2**20:.1f} MB Arrow while loading ({report['seconds']:.2f}s)"
+    )
+    if report.get("max_rss_bytes") is not None:
+        caption += f" · process peak {report['max_rss_bytes'] / 2**20:.0f} MB"
+    st.sidebar.caption(caption)
+
+# Appended grading batches (BATCH_WATCH_DIR) update running statistics
+# for the default dataset instead of forcing a full reload.
+stats = stats_store_for(dataset) if dataset is not None and uploaded_file is None else None
+if stats is not None:
+    chart_key = f"{dataset.key}:{stats.version}"
+    st.sidebar.caption(f"{len(stats.sources)} appended grading batches")
+elif dataset is not None:
+    chart_key = dataset.key
+
+
+def error_index(column):
+    return stats.error_index(column) if stats is not None else error_index_for(dataset, column)
 
-if df is not None:
-    REQUIRED_COLS = ["question", "grade", "student_id"]
-    missing = [col for col in REQUIRED_COLS if col not in df.columns]
-    if missing:
-        st.error(f"Missing required columns: {', '.join(missing)}")
-        st.stop()
 
+if df is not None:
     st.header("📈 Visualizations")
 
     col1, col2 = st.columns(2)
@@ -63,8 +91,10 @@ if df is not None:
             st.session_state.show_grade_dist = not st.session_state.show_grade_dist
         if st.button("📉 Toggle Difficulty & Discrimination Indices"):
             st.session_state.show_difficulty = not st.session_state.show_difficulty
+        if st.button("🗺️ Toggle All-Questions Heatmaps"):
+            st.session_state.show_heatmaps = not st.session_state.show_heatmaps
 
-    question_list = sorted(df["question"].dropna().unique())
+    question_list = stats.questions if stats is not None else sorted(df["question"].dropna().unique())
     if question_list:
         with col2:
             selected_question = st.selectbox("Select a question", question_list, key="q_select")
@@ -80,12 +110,40 @@ if df is not None:
 
     # Show visualizations based on toggle state
     if st.session_state.show_grade_dist:
+        overlay_columns = [col for col in analytics.GRADE_OVERLAY_COLUMNS if col in df.columns]
+        overlay = st.selectbox(
+            "Overlay densities by", [None, *overlay_columns], format_func=lambda col: "None" if col is None else col,
+            key="grade_overlay",
+        )
         with st.spinner("Generating grade distribution..."):
-            vis.grade_distribution(df)
+            vis.grade_distribution(
+                df,
+                cache_key=chart_key,
+                grade_counts=stats.grade_counts() if stats is not None else None,
+                overlay=overlay,
+                group_counts=stats.grade_counts(overlay) if stats is not None and overlay is not None else None,
+            )
 
     if st.session_state.show_difficulty:
+        show_intervals = st.checkbox(
+            "Show 95% bootstrap confidence intervals",
+            key="show_bootstrap",
+            help="Resamples students with replacement to show how stable each index is.",
+        )
         with st.spinner("Calculating difficulty and discrimination indices..."):
-            vis.difficulty_discrimination(df)
+            intervals = None
+            if show_intervals:
+                settings = bootstrap_settings()
+                intervals = (
+                    stats.bootstrap_intervals(**settings) if stats is not None
+                    else intervals_for(dataset, **settings)
+                )
+            vis.difficulty_discrimination(
+                df,
+                cache_key=chart_key,
+                stats=stats.item_statistics() if stats is not None else None,
+                intervals=intervals,
+            )
             
                 # --- Interpretation Help Section ---
         with st.expander("ℹ️ How to Interpret Difficulty & Discrimination Indices"):
@@ -116,13 +174,42 @@ if df is not None:
             )
     
 
+    if st.session_state.show_heatmaps:
+        sort_labels = {"question": "Question", "difficulty": "Difficulty (hardest first)", "dominant": "Dominant category"}
+        sort_by = st.radio(
+            "Sort questions by", list(sort_labels), format_func=sort_labels.get, horizontal=True, key="heatmap_sort"
+        )
+        item_stats = None
+        if sort_by == "difficulty":
+            item_stats = stats.item_statistics() if stats is not None else dataset.derive(
+                "item_statistics", analytics.item_statistics
+            )
+        with st.spinner("Building heatmaps..."):
+            for column, top in (("error_category", None), ("error_summary", st.session_state.get("top_n_slider", 10))):
+                if column in df.columns:
+                    vis.error_heatmap(
+                        df, column, index=error_index(column), top=top, sort_by=sort_by,
+                        stats=item_stats, cache_key=chart_key,
+                    )
+
     if st.session_state.show_top_errors and selected_question:
         with st.spinner("Creating error type plot..."):
-            vis.top_n_error_types(df, selected_question, st.session_state.top_n_slider)
+            vis.top_n_error_types(
+                df,
+                selected_question,
+                st.session_state.top_n_slider,
+                index=error_index("error_summary"),
+                cache_key=chart_key,
+            )
 
     if st.session_state.show_pie_chart and selected_question:
         with st.spinner("Generating NEA pie chart..."):
-            vis.pie_chart_nea(df, selected_question)
+            vis.pie_chart_nea(
+                df,
+                selected_question,
+                index=error_index("error_category"),
+                cache_key=chart_key,
+            )
 
         # --- Interpretation Help Section for NEA Errors ---
         with st.expander("ℹ️ How to Interpret NEA Error Categories"):